@@ -0,0 +1,74 @@
+"""
+Benchmarks for the Google Scholar library (result parsing and renaming).
+"""
+
+import io
+import os
+
+import pytest
+
+from gscholar import gscholar as gs
+from gscholar import bibtex
+from gscholar import rename
+
+from conftest import make_result_page, make_bibitem
+
+
+@pytest.mark.parametrize('outformat', [gs.FORMAT_BIBTEX, gs.FORMAT_ENDNOTE])
+def test_get_links(benchmark, result_page, outformat):
+    benchmark(gs.get_links, result_page, outformat)
+
+
+def test_get_links_large_page(benchmark):
+    html = make_result_page(1000)
+    links = benchmark(gs.get_links, html, gs.FORMAT_BIBTEX)
+    assert len(links) == 1000
+
+
+def test_get_bib_element(benchmark, bibitem):
+
+    def lookup():
+        return [gs._get_bib_element(bibitem, element)
+                for element in ('year', 'author', 'title')]
+
+    assert benchmark(lookup)[0] == '1905'
+
+
+def test_rename_file(benchmark, tmp_path):
+    bibitems = [make_bibitem(n) for n in range(100)]
+
+    def setup():
+        pdfs = []
+        for n in range(len(bibitems)):
+            pdf = tmp_path / ('paper%d.pdf' % n)
+            pdf.touch()
+            pdfs.append(str(pdf))
+        return (pdfs,), {}
+
+    def rename_all(pdfs):
+        for pdf, bibitem in zip(pdfs, bibitems):
+            gs.rename_file(pdf, bibitem)
+        for f in os.listdir(str(tmp_path)):
+            os.remove(os.path.join(str(tmp_path), f))
+
+    benchmark.pedantic(rename_all, setup=setup, rounds=20)
+
+
+def test_bibtex_iter_entries(benchmark):
+    text = ''.join(make_bibitem(n) for n in range(10000))
+
+    def parse_all():
+        return sum(1 for _ in bibtex.iter_entries(io.StringIO(text)))
+
+    assert benchmark(parse_all) == 10000
+
+
+def test_rename_plan(benchmark, tmp_path):
+    items = []
+    for n in range(1000):
+        pdf = tmp_path / ('paper%d.pdf' % n)
+        pdf.touch()
+        # every bibitem twice, so half of the names collide
+        items.append((str(pdf), make_bibitem(n // 2)))
+    moves = benchmark(rename.plan, items)
+    assert len(set(dst for _, dst in moves)) == 1000
@@ -0,0 +1,61 @@
+"""
+Benchmarks for the IEEE Xplore result parser.
+"""
+
+import gc
+import json
+import tracemalloc
+
+import pytest
+
+import ieeelib.ieeeresultparser as ieeeparser
+from ieeelib.record import Article, iter_articles
+
+from conftest import make_ieee_data
+
+
+@pytest.mark.parametrize('nr_of_articles', [1000, 10000, 100000])
+def test_bibtexize(benchmark, nr_of_articles):
+    data = make_ieee_data(nr_of_articles)
+    db = benchmark.pedantic(ieeeparser.bibtexize, args=(data,), rounds=3)
+    assert len(db.entries) == nr_of_articles
+
+
+def test_bibtexize_articles(benchmark):
+    """bibtexize on articles converted to ieeelib.record.Article up front."""
+    data = make_ieee_data(10000)
+    data["articles"] = list(iter_articles(data))
+    db = benchmark.pedantic(ieeeparser.bibtexize, args=(data,), rounds=3)
+    assert len(db.entries) == 10000
+
+
+def test_article_memory(benchmark):
+    """Articles take a fraction of the memory of the decoded json."""
+    raw = json.dumps(make_ieee_data(10000)["articles"])
+
+    def measure(convert):
+        tracemalloc.start()
+        try:
+            articles = convert(json.loads(raw))
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    as_dicts = measure(lambda articles: articles)
+    as_articles = benchmark.pedantic(measure, args=(lambda articles: [Article.from_json(a) for a in articles],),
+                                     rounds=1)
+    benchmark.extra_info["bytes_per_dict"] = as_dicts // 10000
+    benchmark.extra_info["bytes_per_article"] = as_articles // 10000
+    assert as_articles * 2 < as_dicts
+
+
+@pytest.mark.parametrize('jobs', [1, 2, 4])
+def test_dumps_parallel(benchmark, jobs):
+    """Conversion of a large dump in a pool of processes, should scale with the cores."""
+    articles = make_ieee_data(50000)["articles"]
+
+    def convert():
+        return "".join(ieeeparser.dumps_parallel(articles, jobs))
+    bibtex = benchmark.pedantic(convert, rounds=1)
+    assert bibtex.count("@") == 50000
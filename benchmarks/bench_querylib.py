@@ -0,0 +1,29 @@
+"""
+Benchmarks for the query construction.
+"""
+
+import pytest
+
+import querylib
+from querylib.canonical import unique_queries
+
+
+def make_bags(nr_of_bags, bag_size):
+    return [['term %d-%d' % (b, t) for t in range(bag_size)]
+            for b in range(nr_of_bags)]
+
+
+@pytest.mark.parametrize('nr_of_bags,bag_size', [(3, 20), (4, 15), (5, 10)])
+def test_construct_queries(benchmark, nr_of_bags, bag_size):
+    bags = make_bags(nr_of_bags, bag_size)
+    queries = benchmark(querylib.construct_queries, bags, querylib.AND)
+    assert len(queries) == bag_size ** nr_of_bags
+
+
+def test_unique_queries(benchmark):
+    """Combining overlapping bags in both orders yields equivalent queries."""
+    bags = make_bags(3, 10)
+    queries = (querylib.construct_queries(bags, querylib.AND)
+               + querylib.construct_queries(bags[::-1], querylib.AND))
+    unique = benchmark(lambda: list(unique_queries(queries)))
+    assert len(unique) == len(queries) // 2
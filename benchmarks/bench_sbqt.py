@@ -0,0 +1,25 @@
+"""
+End-to-end benchmark of the sbqt pipeline against a local IEEE stand-in.
+
+The rate limits (of the session and of the key pool) are lifted, otherwise
+the benchmark would measure the sleeps between the requests.
+"""
+
+import functools
+
+import ieeelib
+import sbqt
+from ieeelib.keypool import KeyPool
+
+
+def test_ieee_query_pipeline(benchmark, ieee_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(ieeelib.ieeelib, 'IEEE_URL', ieee_server)
+    monkeypatch.setattr(ieeelib.ieeelib, 'DEFAULT_RATE', float('inf'))
+    monkeypatch.setattr(sbqt, 'KeyPool', functools.partial(KeyPool, calls_per_second=float('inf'),
+                                                           calls_per_day=float('inf')))
+    monkeypatch.chdir(str(tmp_path))
+    (tmp_path / sbqt.api_dir).mkdir()
+    (tmp_path / sbqt.api_dir / 'ieee.key').write_text(u'benchmark-key\n')
+    (tmp_path / sbqt.results_dir).mkdir()
+
+    benchmark.pedantic(sbqt.ieee_query, rounds=5)
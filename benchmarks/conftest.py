@@ -0,0 +1,150 @@
+"""
+Shared fixtures for the benchmark suite.
+
+The fixtures generate synthetic but realistically shaped inputs (Google
+Scholar result pages, IEEE Xplore API responses, term bags) and provide a
+local stand-in for the IEEE Xplore API, so the benchmarks never touch the
+network.
+"""
+
+import os
+import sys
+import json
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+# the sibling tools (sbqt, ieeelib, querylib) are not installed, they are
+# imported from the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+CONTENT_TYPES = ("Journals", "Conferences", "Early Access", "Books")
+
+RESULT_BLOCK = (
+    '<div class="gs_r gs_or gs_scl" data-cid="{cid}" data-did="{cid}">'
+    '<div class="gs_ri"><h3 class="gs_rt"><a href="https://example.org/{n}">'
+    'On the electrodynamics of moving bodies, part {n}</a></h3>'
+    '<div class="gs_a">A Einstein - Annalen der Physik, 1905 - Wiley</div>'
+    '<div class="gs_rs">It is known that Maxwell&#39;s electrodynamics '
+    '&hellip; when applied to moving bodies, leads to asymmetries &hellip;</div>'
+    '<div class="gs_fl"><a href="/scholar?cites={cid}&amp;as_sdt=2005&amp;'
+    'sciodt=0,5&amp;hl=en">Cited by {n}</a> '
+    '<a href="https://scholar.googleusercontent.com/scholar.bib?q=info:{cid}:'
+    'scholar.google.com/&amp;output=citation&amp;scisdr=CgX&amp;scisig=AAGBfm0'
+    '&amp;scisf=4&amp;ct=citation&amp;cd=-1&amp;hl=en">Import into BibTeX</a>'
+    '</div></div></div>\n'
+)
+
+
+def make_result_page(nr_of_results=10):
+    """Return a Google Scholar like result page with the given number of hits."""
+    head = '<!doctype html><html><head><title>Scholar</title></head><body>'
+    head += '<div id="gs_hdr">' + ('<span class="gs_ico"></span>' * 200) + '</div>'
+    blocks = ''.join(RESULT_BLOCK.format(cid='x%08dZ' % n, n=n)
+                     for n in range(nr_of_results))
+    return head + blocks + '</body></html>'
+
+
+def make_bibitem(n):
+    """Return a bibtex item as delivered by Google Scholar."""
+    return (
+        '@article{einstein1905electrodynamics%d,\n'
+        '  title={On the electrodynamics of moving bodies, part %d},\n'
+        '  author={Einstein, Albert and Grossmann, Marcel},\n'
+        '  journal={Annalen der Physik},\n'
+        '  volume={17},\n'
+        '  number={10},\n'
+        '  pages={891--921},\n'
+        '  year={1905},\n'
+        '  publisher={Wiley Online Library}\n'
+        '}\n' % (n, n)
+    )
+
+
+def make_article(n):
+    """Return a single article as returned by the IEEE Xplore API."""
+    content_type = CONTENT_TYPES[n % len(CONTENT_TYPES)]
+    return {
+        "article_number": str(8000000 + n),
+        "content_type": content_type,
+        "title": "Security in 5G networks, part %d" % n,
+        "abstract": "We study the security of 5G networks. " * 8,
+        "authors": {"authors": [
+            {"full_name": "Author %d" % i, "affiliation": "University %d" % i}
+            for i in range(4)
+        ]},
+        "doi": "10.1109/ACCESS.2019.%d" % n,
+        "publication_title": "IEEE Access",
+        "conference_location": "Kansas City, MO, USA",
+        "conference_dates": "20-24 May 2019",
+        "publication_date": "2019",
+        "issn": "2169-3536",
+        "isbn": "978-1-5386-8088-9",
+        "issue": "1",
+        "publication_number": "6287639",
+        "volume": "7",
+        "publisher": "IEEE",
+        "start_page": "1",
+        "end_page": "12",
+        "pdf_url": "https://ieeexplore.ieee.org/stamp/stamp.jsp?arnumber=%d" % n,
+        "index_terms": {"author_terms": {"terms": ["5G", "security", "privacy"]}},
+    }
+
+
+def make_ieee_data(nr_of_articles, total_records=None):
+    """Return a decoded IEEE Xplore API response."""
+    return {
+        "total_records": nr_of_articles if total_records is None else total_records,
+        "total_searched": 5000000,
+        "articles": [make_article(n) for n in range(nr_of_articles)],
+    }
+
+
+@pytest.fixture(scope="session")
+def result_page():
+    return make_result_page()
+
+
+@pytest.fixture(scope="session")
+def bibitem():
+    return make_bibitem(1)
+
+
+@pytest.fixture(scope="session")
+def ieee_server():
+    """Serve IEEE Xplore shaped responses on a local port.
+
+    Yields the search URL which can be used in place of `ieeelib.IEEE_URL`.
+    Every page contains 25 articles, and the server claims 200 records in
+    total.
+
+    """
+    body = json.dumps(make_ieee_data(25, total_records=200)).encode('utf8')
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:%d/api/v1/search/articles" % server.server_port
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,5 @@
+from __future__ import absolute_import
+
+from dblplib.dblplib import *
+
+__VERSION__ = '1.0.0'
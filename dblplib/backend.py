@@ -0,0 +1,45 @@
+"""
+DBLP as a querylib.backends.Backend.
+"""
+
+import json
+
+from querylib import qc
+from querylib.backends import Backend, Page, register, make_record
+
+from dblplib import dblplib as dblp
+
+
+def _authors(info):
+    """
+    Return the author names of a hit; DBLP gives a single author as object instead of a list.
+    """
+    authors = info.get("authors", {}).get("author", [])
+    if isinstance(authors, dict):
+        authors = [authors]
+    return [a.get("text") if isinstance(a, dict) else a for a in authors]
+
+
+@register
+class DBLPBackend(Backend):
+    """
+    DBLP, via its open json search API.
+    """
+    name = 'dblp'
+    label = qc.DBLP
+    page_size = dblp.MAX_RECORDS
+    rate = dblp.DEFAULT_RATE
+
+    def fetch(self, query, start, count, session):
+        return dblp.query(query, start, count, session)
+
+    def parse(self, raw):
+        hits = json.loads(raw).get("result", {}).get("hits", {})
+        records = []
+        for hit in hits.get("hit", []):
+            info = hit.get("info", {})
+            records.append(make_record(
+                'dblp', info.get("key"), info.get("title"), _authors(info),
+                info.get("year"), info.get("doi"), info.get("venue"),
+                info.get("ee") or info.get("url"), info))
+        return Page(records, int(hits.get("@total", 0)))
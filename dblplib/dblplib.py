@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Library to query the DBLP computer science bibliography.
+
+Call the method query with a string which contains the full search
+string. Query will return the json result of DBLP's search API.
+"""
+
+from urllib.parse import quote
+
+import logging
+
+from querylib.hooks import span
+from querylib.http import fetch
+
+DBLP_URL = "https://dblp.org/search/publ/api"
+
+MAX_RECORDS = 1000 # maximum number of hits per request allowed by DBLP
+# requests per second, DBLP asks to be polite
+DEFAULT_RATE = 1
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+logger = logging.getLogger(__name__)
+
+
+def query(search_str, first=0, max_records=MAX_RECORDS, session=None):
+    """Query DBLP.
+
+    This method queries DBLP and returns a json string with the result.
+
+    Parameters
+    ----------
+    search_str : str
+        the query
+    first : int, optional
+        the index of the first hit which should be retrieved, starting with 0
+    max_records : int, optional
+        the number of hits to return (at most 1000)
+    session : querylib.http.Session, optional
+        session to send the request with (keeps the connection open)
+
+    Returns
+    -------
+    result : json string
+        the json string with the result of the query
+    """
+    logger.debug("Query: {sstring}".format(sstring=search_str))
+    url = DBLP_URL + "?q=%s&format=json&h=%d&f=%d" % (quote(search_str), max_records, first)
+
+    with span('dblplib.query', query=search_str, start_record=first):
+        return fetch(url, HEADERS, session, DBLP_URL)
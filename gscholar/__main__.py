@@ -6,16 +6,78 @@ import sys
 import os
 
 import gscholar as gs
+from gscholar import daemon
 
 
 logger = logging.getLogger('gscholar')
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    level=logging.WARNING
-)
+
+
+def lookup(options, args, outformat, pdfmode):
+    """Look args up, through the daemon if one is running."""
+    if pdfmode:
+        method = 'pdflookup'
+        kwargs = dict(pdf=os.path.abspath(args), allresults=options.all,
+                      outformat=outformat, startpage=options.startpage)
+    else:
+        method = 'query'
+        kwargs = dict(searchstr=args, outformat=outformat, allresults=options.all)
+    if not options.no_daemon:
+        try:
+            return daemon.call(method, options.socket, **kwargs)
+        except OSError:
+            logger.debug("No daemon running, doing the lookup myself.")
+        except daemon.DaemonError as e:
+            print("Lookup failed: {e}".format(e=e), file=sys.stderr)
+            sys.exit(1)
+    if pdfmode:
+        return gs.pdflookup(**kwargs)
+    return gs.query(**kwargs)
+
+
+def run_batch(options, outformat):
+    """Run the lookups listed in options.batch, print results as JSON lines."""
+    import json
+    from gscholar import batch
+    from querylib.http import Session
+
+    if options.batch == '-':
+        infile = sys.stdin
+    else:
+        infile = open(options.batch)
+    session = Session(rate=options.rate or batch.DEFAULT_RATE, headers=gs.HEADERS)
+    failed = 0
+    to_rename = []
+    try:
+        records = batch.run(batch.read_items(infile), options.jobs, options.ordered,
+                            session, outformat=outformat, allresults=options.all,
+                            startpage=options.startpage)
+        for record in records:
+            if 'error' in record:
+                failed += 1
+            elif options.rename and 'pdf' in record['input'] and record['results']:
+                to_rename.append((record['input']['pdf'], record['results'][0]))
+            print(json.dumps(record))
+            sys.stdout.flush()
+    finally:
+        session.close()
+        if infile is not sys.stdin:
+            infile.close()
+    if to_rename:
+        renamed = gs.rename_files(to_rename, options.dry_run, options.undo_log)
+        for pdf, newfile in sorted(renamed.items()):
+            print("{verb} {in_} to {out}".format(
+                verb="Would rename" if options.dry_run else "Renamed", in_=pdf, out=newfile),
+                file=sys.stderr)
+    if failed:
+        logger.warning("{n} lookups failed.".format(n=failed))
+        sys.exit(1)
 
 
 def main():
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)s %(name)s %(message)s',
+        level=logging.WARNING
+    )
     usage = 'Usage: %prog [options] {pdf | "search terms"}'
     parser = optparse.OptionParser(usage)
     parser.add_option("-a", "--all", action="store_true", dest="all",
@@ -24,6 +86,12 @@ def main():
                       default=False, help="show debugging output")
     parser.add_option("-r", "--rename", action="store_true", dest="rename",
                       default=False, help="rename file")
+    parser.add_option("-n", "--dry-run", action="store_true", dest="dry_run",
+                      default=False, help="only show how the file would be renamed")
+    parser.add_option("--undo-log", dest="undo_log",
+                      help="record renames in this file, so they can be undone")
+    parser.add_option("--undo", dest="undo", metavar="UNDO_LOG",
+                      help="undo the renames recorded in UNDO_LOG and quit")
     parser.add_option("-f", "--outputformat", dest='output',
                       default="bibtex",
                       help="Output format. Available formats are: bibtex, endnote, refman, wenxianwang [default: %default]")
@@ -31,6 +99,25 @@ def main():
                       help="Page number to start parsing PDF file at.")
     parser.add_option('-V', '--version', action='store_true',
                       help='Print version and quit.')
+    parser.add_option("--daemon", action="store_true", dest="daemon",
+                      default=False,
+                      help="run as daemon, serving lookups of other gscholar calls")
+    parser.add_option("--no-daemon", action="store_true", dest="no_daemon",
+                      default=False,
+                      help="do the lookup in this process even if a daemon is running")
+    parser.add_option("-b", "--batch", dest="batch", metavar="FILE",
+                      help="run the lookups listed in FILE (- for stdin), one query, "
+                           "pdf or JSON object per line, and print JSON lines")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=4,
+                      help="number of concurrent lookups in batch mode [default: %default]")
+    parser.add_option("--ordered", action="store_true", dest="ordered",
+                      default=False, help="print batch results in input order")
+    parser.add_option("--rate", dest="rate", type="float",
+                      help="maximal number of requests per second to Google Scholar "
+                           "in batch and daemon mode [default: 1]")
+    parser.add_option("--socket", dest="socket",
+                      help="Unix socket of the daemon [default: $GSCHOLAR_SOCKET "
+                           "or gscholar-UID.sock in $XDG_RUNTIME_DIR]")
 
     (options, args) = parser.parse_args()
     if options.debug is True:
@@ -38,6 +125,16 @@ def main():
     if options.version:
         print(gs.__VERSION__)
         return
+    if options.daemon:
+        try:
+            daemon.serve(options.socket, options.rate or daemon.DEFAULT_RATE)
+        except daemon.AlreadyRunning as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return
+    if options.undo:
+        print("Reverted %d renames." % gs.rename.undo(options.undo))
+        return
     if options.output == 'bibtex':
         outformat = gs.FORMAT_BIBTEX
     elif options.output == 'endnote':
@@ -46,6 +143,9 @@ def main():
         outformat = gs.FORMAT_REFMAN
     elif options.output == 'wenxianwang':
         outformat = gs.FORMAT_WENXIANWANG
+    if options.batch:
+        run_batch(options, outformat)
+        return
     if len(args) != 1:
         parser.error("No argument given, nothing to do.")
         sys.exit(1)
@@ -54,10 +154,9 @@ def main():
     if os.path.exists(args):
         logger.debug("File exist, assuming you want me to lookup the pdf: {filename}.".format(filename=args))
         pdfmode = True
-        biblist = gs.pdflookup(args, all, outformat, options.startpage)
     else:
         logger.debug("Assuming you want me to lookup the query: {query}".format(query=args))
-        biblist = gs.query(args, outformat, options.all)
+    biblist = lookup(options, args, outformat, pdfmode)
     if len(biblist) < 1:
         print("No results found, try again with a different query!")
         sys.exit(1)
@@ -73,7 +172,9 @@ def main():
             print("You asked me to rename the pdf but didn't tell me which file to rename, aborting.")
             sys.exit(1)
         else:
-            gs.rename_file(args, biblist[0])
+            newfile = gs.rename_file(args, biblist[0], options.dry_run, options.undo_log)
+            if options.dry_run:
+                print("Would rename {in_} to {out}".format(in_=args, out=newfile))
 
 
 if __name__ == '__main__':
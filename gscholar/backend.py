@@ -0,0 +1,70 @@
+"""
+Google Scholar as a `querylib.backends.Backend`.
+"""
+
+from querylib import qc, canonical
+from querylib.backends import Backend, Page, register, make_record
+
+from gscholar import gscholar as gs
+from gscholar import bibtex
+
+# citing papers followed per paper
+MAX_CITING = 100
+
+
+@register
+class ScholarBackend(Backend):
+    """Google Scholar, 10 bibtex results per page.
+
+    Scholar doesn't report the total number of results, so pages are
+    fetched one after another until an empty one. Records carry the Scholar
+    cluster id in `cluster`, which `citing` uses to find the papers citing
+    them.
+
+    Parameters
+    ----------
+    max_citing : int, optional
+        maximal number of citing papers returned per paper, None for all.
+        Every page of 10 takes 11 requests.
+
+    """
+    name = 'scholar'
+    label = qc.SCHOLAR
+    page_size = 10
+    rate = 1.0
+    syntax = canonical.SCHOLAR
+
+    def __init__(self, max_citing=MAX_CITING):
+        self.max_citing = max_citing
+
+    def fetch(self, query, start, count, session):
+        return gs.search(query, gs.FORMAT_BIBTEX, True, session, start, count)
+
+    def citing(self, record, session=None):
+        if not record.get('cluster'):
+            return []
+        records = []
+        start = 0
+        while self.max_citing is None or len(records) < self.max_citing:
+            raw = gs.cited_by(record['cluster'], gs.FORMAT_BIBTEX, True, session, start)
+            if not raw:
+                break
+            records.extend(self.parse(raw).records)
+            # results without a bibtex link are dropped, so a page may hold
+            # fewer records than page_size without being the last one
+            start += self.page_size
+        return records[:self.max_citing]
+
+    def parse(self, raw):
+        records = []
+        for bib, cluster in raw:
+            entry = bibtex.parse_entry(bib) or {}
+            authors = entry.get('author')
+            records.append(make_record(
+                'scholar', entry.get('ID'), entry.get('title'),
+                authors.split(' and ') if authors else [],
+                entry.get('year'), entry.get('doi'),
+                entry.get('journal') or entry.get('booktitle'),
+                entry.get('url'), bib))
+            records[-1]['cluster'] = cluster
+        return Page(records)
@@ -0,0 +1,132 @@
+"""
+Run many lookups concurrently.
+
+The input has one lookup per line: either plain text (a path to a pdf if
+the file exists, a query otherwise) or a JSON object like
+`{"query": "albert einstein"}` or `{"pdf": "paper.pdf", "id": 17}`. All
+lookups share one `querylib.http.Session`, so connections are reused and
+the rate limit holds for the whole batch.
+
+The results are JSON objects carrying the index and input of the lookup
+and either its `results` or the `error` it failed with. They are yielded
+as soon as they are ready, or in input order if requested.
+"""
+
+import os
+import json
+import logging
+
+from gscholar import gscholar as gs
+
+
+DEFAULT_JOBS = 4
+# requests per second to Google Scholar
+DEFAULT_RATE = 1.0
+
+
+logger = logging.getLogger(__name__)
+
+
+def read_items(lines):
+    """Turn input lines into lookup items.
+
+    Parameters
+    ----------
+    lines : iterable of str
+
+    Yields
+    ------
+    dict
+        with either the key "query" or "pdf"
+
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                item = {'invalid': line, 'error': 'Invalid JSON: %s' % e}
+        elif os.path.exists(line):
+            item = {'pdf': line}
+        else:
+            item = {'query': line}
+        yield item
+
+
+def lookup(item, outformat=gs.FORMAT_BIBTEX, allresults=False,
+           startpage=None, session=None):
+    """Run a single lookup and return its results.
+
+    Raises
+    ------
+    ValueError
+        if the item neither has a query nor a pdf
+
+    """
+    if 'error' in item:
+        raise ValueError(item['error'])
+    if 'pdf' in item:
+        return gs.pdflookup(item['pdf'], item.get('allresults', allresults),
+                            outformat, item.get('startpage', startpage), session)
+    if 'query' in item:
+        return gs.query(item['query'], outformat,
+                        item.get('allresults', allresults), session)
+    raise ValueError("Item has neither 'query' nor 'pdf': %r" % (item,))
+
+
+def _record(index, item, future):
+    record = {'index': index, 'input': item}
+    try:
+        record['results'] = future.result()
+    except Exception as e:
+        logger.debug("Lookup {index} failed".format(index=index), exc_info=True)
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+    return record
+
+
+def run(items, jobs=DEFAULT_JOBS, ordered=False, session=None, **kwargs):
+    """Run the lookups concurrently and yield the results.
+
+    At most 2 * jobs lookups are queued at a time, so arbitrarily long
+    inputs can be streamed.
+
+    Parameters
+    ----------
+    items : iterable of dict
+        as returned by `read_items`
+    jobs : int, optional
+        number of concurrent lookups
+    ordered : bool, optional
+        yield the results in input order instead of as soon as possible
+    session : querylib.http.Session, optional
+        shared session, a new one (with rate limit DEFAULT_RATE) by default
+    kwargs :
+        passed to `lookup` (outformat, allresults, startpage)
+
+    Yields
+    ------
+    dict
+        the records with "index", "input" and "results" or "error"
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from querylib.http import Session
+    from querylib.tasks import bounded
+
+    own_session = session is None
+    if own_session:
+        session = Session(rate=DEFAULT_RATE, headers=gs.HEADERS)
+
+    def run_one(indexed):
+        return lookup(indexed[1], session=session, **kwargs)
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for (index, item), future in bounded(executor, run_one, enumerate(items), 2 * jobs, ordered):
+                yield _record(index, item, future)
+    finally:
+        if own_session:
+            session.close()
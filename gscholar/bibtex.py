@@ -0,0 +1,272 @@
+"""
+Minimal single-pass BibTeX parser.
+
+Parses entries into plain dicts holding all fields at once. The entry type
+and citation key are stored under `ENTRYTYPE` and `ID` (the same keys
+bibtexparser uses), field names are lower cased. Values keep their inner
+braces (e.g. `{IEEE} Access`), only the outer delimiters are removed and
+whitespace is normalized. `@string` macros and `#` concatenation are
+resolved, `@comment` and `@preamble` are skipped.
+
+Large files can be parsed as a stream with `iter_entries`, which only holds
+a single entry in memory at a time.
+"""
+
+import re
+
+
+# macros predefined by BibTeX
+MONTHS = {
+    'jan': 'January', 'feb': 'February', 'mar': 'March', 'apr': 'April',
+    'may': 'May', 'jun': 'June', 'jul': 'July', 'aug': 'August',
+    'sep': 'September', 'oct': 'October', 'nov': 'November',
+    'dec': 'December',
+}
+
+CHUNKSIZE = 1 << 16
+
+_ENTRY_START = re.compile(r'@\s*([A-Za-z]+)\s*([{(])')
+_DELIMITERS = re.compile(r'[{}()"]')
+_BRACES = re.compile(r'[{}]')
+_QUOTE_OR_BRACES = re.compile(r'[{}"]')
+_KEY = re.compile(r'\s*([^\s,={}()]*)\s*,')
+_FIELD_NAME = re.compile(r'[\s,]*([^\s,={}()"#]+)\s*=\s*')
+_BARE_VALUE = re.compile(r'[^\s,#{}()"]+')
+_CONCAT = re.compile(r'\s*#\s*')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class BibtexError(ValueError):
+    """Raised on malformed BibTeX input."""
+
+
+def _find_end(text, pos, opener):
+    """Return the index of the delimiter closing the entry opened at pos.
+
+    Returns -1 if the entry is not complete yet. A `)` in a quoted value
+    doesn't close an entry opened with `(`.
+
+    """
+    depth = 0
+    quoted = False
+    regex = _BRACES if opener == '{' else _DELIMITERS
+    for m in regex.finditer(text, pos):
+        c = m.group()
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            if depth == 0:
+                if opener == '{':
+                    return m.start()
+                raise BibtexError("Unbalanced braces at offset %d" % m.start())
+            depth -= 1
+        elif depth == 0:
+            if c == '"':
+                quoted = not quoted
+            elif c == ')' and not quoted:
+                return m.start()
+    return -1
+
+
+def _read_braced(text, pos):
+    """Read the braced value starting at text[pos] == '{'.
+
+    Returns the value without the outer braces and the position after it.
+
+    """
+    depth = 0
+    for m in _BRACES.finditer(text, pos):
+        if m.group() == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return text[pos + 1:m.start()], m.end()
+    raise BibtexError("Unterminated value at offset %d" % pos)
+
+
+def _read_quoted(text, pos):
+    """Read the quoted value starting at text[pos] == '"'."""
+    depth = 0
+    for m in _QUOTE_OR_BRACES.finditer(text, pos + 1):
+        c = m.group()
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        elif depth == 0:
+            return text[pos + 1:m.start()], m.end()
+    raise BibtexError("Unterminated value at offset %d" % pos)
+
+
+def _read_value(text, pos, macros):
+    """Read a (possibly concatenated) value starting at pos."""
+    parts = []
+    while True:
+        c = text[pos:pos + 1]
+        if c == '{':
+            part, pos = _read_braced(text, pos)
+        elif c == '"':
+            part, pos = _read_quoted(text, pos)
+        else:
+            m = _BARE_VALUE.match(text, pos)
+            if m is None:
+                raise BibtexError("Missing value at offset %d" % pos)
+            part = m.group()
+            pos = m.end()
+            if not part.isdigit():
+                part = macros.get(part.lower(), part)
+        parts.append(part)
+        m = _CONCAT.match(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+    return _WHITESPACE.sub(' ', ''.join(parts)).strip(), pos
+
+
+def _parse_fields(body, macros):
+    """Parse the `name = value` pairs in body and return them as a dict."""
+    fields = {}
+    pos = 0
+    while True:
+        m = _FIELD_NAME.match(body, pos)
+        if m is None:
+            break
+        value, pos = _read_value(body, m.end(), macros)
+        fields[m.group(1).lower()] = value
+    if body[pos:].strip(' \t\r\n,'):
+        raise BibtexError("Unexpected text in entry: %r" % body[pos:pos + 40])
+    return fields
+
+
+def _parse_entry(entrytype, body, macros):
+    """Turn the body of an entry into a dict, or update macros.
+
+    Returns None for entries which are not references (@string, ...).
+
+    """
+    entrytype = entrytype.lower()
+    if entrytype == 'string':
+        macros.update(_parse_fields(body, macros))
+        return None
+    if entrytype in ('comment', 'preamble'):
+        return None
+    m = _KEY.match(body)
+    if m is not None:
+        key, pos = m.group(1), m.end()
+    else:
+        # an entry without fields
+        key, pos = body.strip(), len(body)
+    entry = _parse_fields(body[pos:], macros)
+    entry['ENTRYTYPE'] = entrytype
+    entry['ID'] = key
+    return entry
+
+
+def _new_macros(macros):
+    table = dict(MONTHS)
+    if macros:
+        table.update((k.lower(), v) for k, v in macros.items())
+    return table
+
+
+def parse(text, macros=None):
+    """Parse all entries in text.
+
+    Parameters
+    ----------
+    text : str
+    macros : dict, optional
+        additional `@string` macros
+
+    Returns
+    -------
+    List[dict]
+        the entries
+
+    """
+    macros = _new_macros(macros)
+    entries = []
+    pos = 0
+    while True:
+        m = _ENTRY_START.search(text, pos)
+        if m is None:
+            break
+        end = _find_end(text, m.end(), m.group(2))
+        if end < 0:
+            raise BibtexError("Unterminated entry at offset %d" % m.start())
+        entry = _parse_entry(m.group(1), text[m.end():end], macros)
+        if entry is not None:
+            entries.append(entry)
+        pos = end + 1
+    return entries
+
+
+def parse_entry(text, macros=None):
+    """Parse the first entry in text and return it, or None."""
+    macros = _new_macros(macros)
+    pos = 0
+    while True:
+        m = _ENTRY_START.search(text, pos)
+        if m is None:
+            return None
+        end = _find_end(text, m.end(), m.group(2))
+        if end < 0:
+            raise BibtexError("Unterminated entry at offset %d" % m.start())
+        entry = _parse_entry(m.group(1), text[m.end():end], macros)
+        if entry is not None:
+            return entry
+        pos = end + 1
+
+
+def iter_entries(fileobj, macros=None, chunksize=CHUNKSIZE):
+    """Yield the entries of a (large) BibTeX file one at a time.
+
+    Parameters
+    ----------
+    fileobj : file
+        a file opened in text mode
+    macros : dict, optional
+        additional `@string` macros
+    chunksize : int, optional
+        number of characters to read at once
+
+    Yields
+    ------
+    dict
+        the entries
+
+    """
+    macros = _new_macros(macros)
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        m = _ENTRY_START.search(buf, pos)
+        end = -1
+        if m is not None:
+            end = _find_end(buf, m.end(), m.group(2))
+        if end >= 0:
+            entry = _parse_entry(m.group(1), buf[m.end():end], macros)
+            if entry is not None:
+                yield entry
+            pos = end + 1
+            continue
+        if eof:
+            if m is not None:
+                raise BibtexError("Unterminated entry at end of file")
+            return
+        # drop everything consumed so far (but keep a possibly truncated
+        # entry start) and read more
+        if m is not None:
+            keep = m.start()
+        else:
+            keep = buf.rfind('@', pos)
+            if keep < 0:
+                keep = len(buf)
+        buf = buf[keep:]
+        pos = 0
+        chunk = fileobj.read(chunksize)
+        if not chunk:
+            eof = True
+        buf += chunk
@@ -0,0 +1,262 @@
+"""
+Long-running gscholar process serving lookups over a Unix socket.
+
+Starting the interpreter and opening a new TLS connection to Google Scholar
+costs more than a lookup itself. The daemon keeps a `querylib.http.Session`
+(warm connections and rate limiter state) and a cache of recent results in
+one process; the CLI then only sends its request over the socket:
+
+    $ gscholar --daemon &
+    $ gscholar "albert einstein"    # answered by the daemon
+
+The protocol is one JSON object per line in each direction. A request is
+`{"method": "query" | "pdflookup", "args": {...}}`, the reply is either
+`{"result": [...]}` or `{"error": "..."}`.
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+
+
+# requests per second to Google Scholar
+DEFAULT_RATE = 1.0
+CACHE_SIZE = 1024
+CLIENT_TIMEOUT = 300
+
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(RuntimeError):
+    """Raised by the client if the daemon reports an error."""
+
+
+class AlreadyRunning(RuntimeError):
+    """Raised if a daemon is already listening on the socket."""
+
+
+def default_socket():
+    """Return the path of the daemon's socket.
+
+    Can be set with the environment variable GSCHOLAR_SOCKET.
+
+    """
+    path = os.environ.get('GSCHOLAR_SOCKET')
+    if path:
+        return path
+    rundir = os.environ.get('XDG_RUNTIME_DIR')
+    if not rundir:
+        import tempfile
+        rundir = tempfile.gettempdir()
+    return os.path.join(rundir, 'gscholar-%d.sock' % os.getuid())
+
+
+class _Cache(object):
+    """Thread safe LRU cache."""
+
+    def __init__(self, size=CACHE_SIZE):
+        from collections import OrderedDict
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+def _handle(request, session, cache):
+    """Run a single request and return the result."""
+    from gscholar import gscholar as gs
+
+    method = request.get('method')
+    args = request.get('args', {})
+    if method == 'query':
+        call = lambda: gs.query(args['searchstr'], args.get('outformat', gs.FORMAT_BIBTEX),
+                                args.get('allresults', False), session)
+    elif method == 'pdflookup':
+        call = lambda: gs.pdflookup(args['pdf'], args.get('allresults', False),
+                                    args.get('outformat', gs.FORMAT_BIBTEX),
+                                    args.get('startpage'), session)
+    else:
+        raise ValueError("Unknown method: %r" % method)
+    if method == 'pdflookup':
+        # the file might change between calls
+        return call()
+    key = json.dumps([method, args], sort_keys=True)
+    result = cache.get(key)
+    if result is None:
+        result = call()
+        cache.put(key, result)
+    return result
+
+
+def make_server(path=None, rate=DEFAULT_RATE):
+    """Return a server listening on the Unix socket path.
+
+    A stale socket (left behind by a daemon which was killed) is removed.
+    Call `serve_forever` on the server to answer lookups; `server_close`
+    closes the session and removes the socket.
+
+    Parameters
+    ----------
+    path : str, optional
+        the socket, default see `default_socket`
+    rate : float, optional
+        maximal number of requests per second to Google Scholar
+
+    Raises
+    ------
+    AlreadyRunning
+        if another daemon is listening on path
+
+    """
+    import socketserver
+    from gscholar import gscholar as gs
+    from querylib.http import Session
+
+    path = path or default_socket()
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    reply = {'result': _handle(json.loads(line.decode('utf8')),
+                                               self.server.session, self.server.cache)}
+                except Exception as e:
+                    logger.exception("Request failed")
+                    reply = {'error': '%s: %s' % (type(e).__name__, e)}
+                self.wfile.write(json.dumps(reply).encode('utf8') + b'\n')
+                self.wfile.flush()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def server_close(self):
+            socketserver.UnixStreamServer.server_close(self)
+            self.session.close()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    if os.path.exists(path):
+        # remove a stale socket, but don't steal a running daemon's socket
+        try:
+            _connect(path).close()
+        except OSError:
+            os.unlink(path)
+        else:
+            raise AlreadyRunning("A daemon is already listening on %s" % path)
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+    server.session = Session(rate=rate, headers=gs.HEADERS)
+    server.cache = _Cache()
+    return server
+
+
+def serve(path=None, rate=DEFAULT_RATE):
+    """Serve lookups on the Unix socket path until interrupted or terminated.
+
+    Parameters
+    ----------
+    path : str, optional
+        the socket, default see `default_socket`
+    rate : float, optional
+        maximal number of requests per second to Google Scholar
+
+    Raises
+    ------
+    AlreadyRunning
+        if another daemon is listening on path
+
+    """
+    import signal
+
+    server = make_server(path, rate)
+    logger.info("Listening on {path}".format(path=server.server_address))
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    # signal handlers can only be installed in the main thread
+    main = threading.current_thread() is threading.main_thread()
+    if main:
+        old_handler = signal.signal(signal.SIGTERM, terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if main:
+            signal.signal(signal.SIGTERM, old_handler)
+        server.server_close()
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def call(method, path=None, **args):
+    """Send a request to the daemon and return the result.
+
+    Parameters
+    ----------
+    method : str
+        "query" or "pdflookup"
+    path : str, optional
+        the socket, default see `default_socket`
+    args :
+        the arguments of `gscholar.query` or `gscholar.pdflookup`
+
+    Returns
+    -------
+    List[str]
+        the list with citations
+
+    Raises
+    ------
+    OSError
+        if no daemon is listening on the socket
+    DaemonError
+        if the lookup failed
+
+    """
+    sock = _connect(path or default_socket())
+    sock.settimeout(CLIENT_TIMEOUT)
+    try:
+        sock.sendall(json.dumps({'method': method, 'args': args}).encode('utf8') + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    except OSError as e:
+        # the daemon is running, don't let the caller fall back
+        raise DaemonError("Talking to the daemon failed: %s" % e)
+    finally:
+        sock.close()
+    if not line:
+        raise DaemonError("The daemon closed the connection.")
+    reply = json.loads(line.decode('utf8'))
+    if 'error' in reply:
+        raise DaemonError(reply['error'])
+    return reply['result']
@@ -10,23 +10,20 @@ string. Query will return a list of citations.
 
 try:
     # python 2
-    from urllib2 import Request, urlopen, quote
+    from urllib import quote
 except ImportError:
     # python 3
-    from urllib.request import Request, urlopen, quote
-
-try:
-    # python 2
-    from htmlentitydefs import name2codepoint
-except ImportError:
-    # python 3
-    from html.entities import name2codepoint
+    from urllib.parse import quote
 
 import re
-import os
-import subprocess
 import logging
 
+from querylib.hooks import span
+from querylib.http import fetch
+from querylib.canonical import canonical_query, SingleFlight, SCHOLAR
+from gscholar import bibtex
+from gscholar import rename
+
 
 GOOGLE_SCHOLAR_URL = "https://scholar.google.com"
 HEADERS = {'User-Agent': 'Mozilla/5.0'}
@@ -39,8 +36,11 @@ FORMAT_WENXIANWANG = 5
 
 logger = logging.getLogger(__name__)
 
+# equivalent lookups running at the same time are only sent once
+_flight = SingleFlight()
 
-def query(searchstr, outformat=FORMAT_BIBTEX, allresults=False):
+
+def query(searchstr, outformat=FORMAT_BIBTEX, allresults=False, session=None, start=0):
     """Query google scholar.
 
     This method queries google scholar and returns a list of citations.
@@ -53,6 +53,11 @@ def query(searchstr, outformat=FORMAT_BIBTEX, allresults=False):
         the output format of the citations. Default is bibtex.
     allresults : bool, optional
         return all results or only the first (i.e. best one)
+    session : querylib.http.Session, optional
+        session to send the requests with, keeps connections open between
+        queries. By default every request opens a new connection.
+    start : int, optional
+        index of the first result, used to get further result pages
 
     Returns
     -------
@@ -61,28 +66,104 @@ def query(searchstr, outformat=FORMAT_BIBTEX, allresults=False):
 
     """
     logger.debug("Query: {sstring}".format(sstring=searchstr))
-    searchstr = '/scholar?q='+quote(searchstr)
-    url = GOOGLE_SCHOLAR_URL + searchstr
-    header = HEADERS
+    with span('gscholar.query', query=searchstr) as s:
+        result = [bib for bib, cluster in _search(searchstr, outformat, allresults, session, start)]
+        s.set('records', len(result))
+    return result
+
+
+def cited_by(cluster, outformat=FORMAT_BIBTEX, allresults=True, session=None, start=0):
+    """Return the citations of the papers citing a paper.
+
+    Parameters
+    ----------
+    cluster : str
+        the Google Scholar cluster id of the cited paper, as returned by
+        `search`
+    outformat : int, optional
+        the output format of the citations. Default is bibtex.
+    allresults : bool, optional
+        return all results or only the first
+    session : querylib.http.Session, optional
+        session to send the requests with
+    start : int, optional
+        index of the first result, used to get further result pages
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        pairs of citation and cluster id (None if the paper isn't cited)
+
+    """
+    logger.debug("Cited by: {cluster}".format(cluster=cluster))
+    with span('gscholar.cited_by', cluster=cluster) as s:
+        url = GOOGLE_SCHOLAR_URL + '/scholar?cites=' + quote(cluster)
+        key = ('cites', cluster, outformat, allresults, start, None)
+        result = _flight.do(key, _lookup, url, outformat, allresults, session, start)
+        s.set('records', len(result))
+    return result
+
+
+def search(searchstr, outformat=FORMAT_BIBTEX, allresults=True, session=None, start=0, count=None):
+    """Query google scholar, returning the cluster ids along the citations.
+
+    Like `query`, but the cluster id of every result is returned as well,
+    which can be passed to `cited_by`.
+
+    Parameters
+    ----------
+    count : int, optional
+        maximal number of citations, only the links of these are followed.
+        None for all results of the page.
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        pairs of citation and cluster id (None if the paper isn't cited)
+
+    """
+    logger.debug("Query: {sstring}".format(sstring=searchstr))
+    with span('gscholar.query', query=searchstr) as s:
+        # the list is shared with concurrent equivalent searches
+        result = list(_search(searchstr, outformat, allresults, session, start, count))
+        s.set('records', len(result))
+    return result
+
+
+def _search(searchstr, outformat, allresults, session, start, count=None):
+    url = GOOGLE_SCHOLAR_URL + '/scholar?q=' + quote(searchstr)
+    key = ('q', canonical_query(searchstr, SCHOLAR), outformat, allresults, start, count)
+    return _flight.do(key, _lookup, url, outformat, allresults, session, start, count)
+
+
+def _lookup(url, outformat, allresults, session, start, count=None):
+    """Fetch a result page and follow the links to the citations.
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        pairs of citation and cluster id
+
+    """
+    if start:
+        url += '&start=%d' % start
+    header = dict(HEADERS)
     header['Cookie'] = "GSP=CF=%d" % outformat
-    request = Request(url, headers=header)
-    response = urlopen(request)
-    html = response.read()
-    html = html.decode('utf8')
+    html = fetch(url, header, session)
     # grab the links
-    tmp = get_links(html, outformat)
+    with span('gscholar.parse'):
+        tmp = get_entries(html, outformat)
 
     # follow the bibtex links to get the bibtex entries
     result = list()
     if not allresults:
-        tmp = tmp[:1]
-    for link in tmp:
+        count = 1
+    if count is not None:
+        tmp = tmp[:count]
+    for link, cluster in tmp:
         url = GOOGLE_SCHOLAR_URL+link
-        request = Request(url, headers=header)
-        response = urlopen(request)
-        bib = response.read()
-        bib = bib.decode('utf8')
-        result.append(bib)
+        bib = fetch(url, header, session)
+        result.append((bib, cluster))
     return result
 
 
@@ -111,11 +192,65 @@ def get_links(html, outformat):
         refre = re.compile(r'<a href="https://scholar.googleusercontent.com(/scholar\.ral\?[^"]*)"')
     reflist = refre.findall(html)
     # escape html entities
-    reflist = [re.sub('&(%s);' % '|'.join(name2codepoint), lambda m:
-                      chr(name2codepoint[m.group(1)]), s) for s in reflist]
+    entityre, name2codepoint = _get_entity_re()
+    reflist = [entityre.sub(lambda m: chr(name2codepoint[m.group(1)]), s)
+               for s in reflist]
     return reflist
 
 
+_RESULT_START = re.compile(r'<div class="gs_r[ "]')
+_CLUSTER_RE = re.compile(r'/scholar\?cites=(\d+)')
+
+
+def get_entries(html, outformat):
+    """Return the reference link and cluster id of every result in the html.
+
+    The cluster id is taken from the "Cited by" link, results which are
+    not cited have the cluster id None.
+
+    Parameters
+    ----------
+    html : str
+    outformat : int
+        the output format of the citations
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        pairs of link and cluster id
+
+    """
+    starts = [m.start() for m in _RESULT_START.finditer(html)]
+    if not starts:
+        return [(link, None) for link in get_links(html, outformat)]
+    entries = []
+    for begin, end in zip(starts, starts[1:] + [len(html)]):
+        block = html[begin:end]
+        links = get_links(block, outformat)
+        if not links:
+            continue
+        cluster = _CLUSTER_RE.search(block)
+        entries.append((links[0], cluster.group(1) if cluster else None))
+    return entries
+
+
+_entity_re = None
+
+
+def _get_entity_re():
+    """Return the (cached) regex matching html entities and the entity table."""
+    global _entity_re
+    try:
+        # python 2
+        from htmlentitydefs import name2codepoint
+    except ImportError:
+        # python 3
+        from html.entities import name2codepoint
+    if _entity_re is None:
+        _entity_re = re.compile('&(%s);' % '|'.join(name2codepoint))
+    return _entity_re, name2codepoint
+
+
 def convert_pdf_to_txt(pdf, startpage=None):
     """Convert a pdf file to text and return the text.
 
@@ -134,6 +269,7 @@ def convert_pdf_to_txt(pdf, startpage=None):
         the converted text
 
     """
+    import subprocess
     if startpage is not None:
         startpageargs = ['-f', str(startpage)]
     else:
@@ -146,7 +282,7 @@ def convert_pdf_to_txt(pdf, startpage=None):
     return stdout
 
 
-def pdflookup(pdf, allresults, outformat, startpage=None):
+def pdflookup(pdf, allresults, outformat, startpage=None, session=None):
     """Look a pdf up on google scholar and return bibtex items.
 
     Paramters
@@ -159,6 +295,8 @@ def pdflookup(pdf, allresults, outformat, startpage=None):
         the output format of the citations
     startpage : int
         first page to start reading from
+    session : querylib.http.Session, optional
+        session to send the requests with
 
     Returns
     -------
@@ -166,51 +304,86 @@ def pdflookup(pdf, allresults, outformat, startpage=None):
         the list with citations
 
     """
-    txt = convert_pdf_to_txt(pdf, startpage)
-    # remove all non alphanumeric characters
-    txt = re.sub("\W", " ", txt)
-    words = txt.strip().split()[:20]
-    gsquery = " ".join(words)
-    bibtexlist = query(gsquery, outformat, allresults)
+    with span('gscholar.pdflookup', pdf=pdf):
+        with span('gscholar.pdftotext', pdf=pdf) as s:
+            txt = convert_pdf_to_txt(pdf, startpage)
+            s.set('bytes', len(txt))
+        # remove all non alphanumeric characters
+        txt = re.sub("\W", " ", txt)
+        words = txt.strip().split()[:20]
+        gsquery = " ".join(words)
+        bibtexlist = query(gsquery, outformat, allresults, session)
     return bibtexlist
 
 
 def _get_bib_element(bibitem, element):
     """Return element from bibitem or None.
 
-    Paramteters
-    -----------
-    bibitem :
-    element :
+    Parameters
+    ----------
+    bibitem : str
+        a bibtex entry
+    element : str
+        the name of the field, e.g. "title"
 
     Returns
     -------
+    str or None
+        the value of the field
 
     """
-    lst = [i.strip() for i in bibitem.split("\n")]
-    for i in lst:
-        if i.startswith(element):
-            value = i.split("=", 1)[-1]
-            value = value.strip()
-            while value.endswith(','):
-                value = value[:-1]
-            while value.startswith('{') or value.startswith('"'):
-                value = value[1:-1]
-            return value
-    return None
-
-
-def rename_file(pdf, bibitem):
+    entry = bibtex.parse_entry(bibitem)
+    if entry is None:
+        return None
+    return entry.get(element.lower())
+
+
+def rename_file(pdf, bibitem, dry_run=False, undo_log=None):
     """Attempt to rename pdf according to bibitem.
 
+    Parameters
+    ----------
+    pdf : str
+        path to the pdf file
+    bibitem : str
+        the bibtex entry
+    dry_run : bool, optional
+        only return the new name, don't rename
+    undo_log : str, optional
+        path of a log to record the rename in, see `gscholar.rename.undo`
+
+    Returns
+    -------
+    str
+        the new path of the pdf
+
+    """
+    return rename_files([(pdf, bibitem)], dry_run, undo_log).get(pdf, pdf)
+
+
+def rename_files(items, dry_run=False, undo_log=None):
+    """Rename many pdfs according to their bibitems at once.
+
+    All target names are planned up front; name clashes get the suffixes
+    -2, -3, ... and existing files are never overwritten. If one rename
+    fails, the whole batch is rolled back.
+
+    Parameters
+    ----------
+    items : iterable of (str, str)
+        pairs of pdf path and bibtex entry
+    dry_run : bool, optional
+        only plan, don't rename
+    undo_log : str, optional
+        path of a log to record the renames in
+
+    Returns
+    -------
+    Dict[str, str]
+        the new path for every renamed pdf
+
     """
-    year = _get_bib_element(bibitem, "year")
-    author = _get_bib_element(bibitem, "author")
-    if author:
-        author = author.split(",")[0]
-    title = _get_bib_element(bibitem, "title")
-    l = [i for i in (year, author, title) if i]
-    filename = "-".join(l) + ".pdf"
-    newfile = pdf.replace(os.path.basename(pdf), filename)
-    logger.info('Renaming {in_} to {out}'.format(in_=pdf, out=newfile))
-    os.rename(pdf, newfile)
+    moves = rename.plan(items)
+    if not dry_run:
+        rename.execute(moves, undo_log)
+    return dict(moves)
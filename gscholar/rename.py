@@ -0,0 +1,234 @@
+"""
+Plan and execute the renaming of many pdfs at once.
+
+All target names of a batch are computed up front (`plan`), sanitized,
+truncated and made unique with deterministic suffixes. The moves are then
+executed as one operation (`execute`): the complete plan is written to an
+undo log first, every move refuses to overwrite an existing file, and if
+one move fails all previous moves of the batch are rolled back. `undo`
+reverts a batch from its undo log.
+"""
+
+import os
+import re
+import json
+import errno
+import logging
+
+from gscholar import bibtex
+
+
+# most file systems limit names to 255 bytes
+MAX_FILENAME_BYTES = 240
+
+_UNSAFE = re.compile(r'[\x00-\x1f\x7f/\\:*?"<>|{}]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenameError(OSError):
+    """Raised if a batch could not be renamed."""
+
+
+def sanitize(name, maxbytes=MAX_FILENAME_BYTES):
+    """Make name safe to be used as a file name.
+
+    Removes path separators, control characters, braces and characters not
+    allowed on common file systems, collapses whitespace and truncates the
+    name to maxbytes (utf8 encoded) without splitting characters.
+
+    Parameters
+    ----------
+    name : str
+    maxbytes : int, optional
+
+    Returns
+    -------
+    str
+
+    """
+    name = _UNSAFE.sub('', name)
+    name = _WHITESPACE.sub(' ', name).strip().lstrip('.')
+    encoded = name.encode('utf8')
+    if len(encoded) > maxbytes:
+        name = encoded[:maxbytes].decode('utf8', 'ignore').rstrip()
+    return name
+
+
+def make_filename(bibitem, ext='.pdf', maxbytes=MAX_FILENAME_BYTES):
+    """Return the file name for bibitem: year-author-title.
+
+    Parameters
+    ----------
+    bibitem : str or dict
+        a bibtex entry, either as string or as parsed by `gscholar.bibtex`
+    ext : str, optional
+    maxbytes : int, optional
+
+    Returns
+    -------
+    str or None
+        None if the bibitem has neither year, author nor title
+
+    Raises
+    ------
+    gscholar.bibtex.BibtexError
+        if the bibitem is malformed
+
+    """
+    if not isinstance(bibitem, dict):
+        bibitem = bibtex.parse_entry(bibitem) or {}
+    year = bibitem.get("year")
+    author = bibitem.get("author")
+    if author:
+        author = author.split(",")[0]
+    title = bibitem.get("title")
+    l = [i for i in (year, author, title) if i]
+    if not l:
+        return None
+    stem = sanitize("-".join(l), maxbytes - len(ext.encode('utf8')))
+    return stem + ext
+
+
+def _with_suffix(filename, n, maxbytes):
+    """Return filename with the suffix -n, truncated to maxbytes."""
+    stem, ext = os.path.splitext(filename)
+    suffix = "-%d%s" % (n, ext)
+    stem = sanitize(stem, maxbytes - len(suffix.encode('utf8')))
+    return stem + suffix
+
+
+def plan(items, ext='.pdf', maxbytes=MAX_FILENAME_BYTES):
+    """Compute the target names for a batch of pdfs.
+
+    Files are handled in sorted order, so the same batch always gives the
+    same plan. If a name is already taken (by an existing file or an
+    earlier file of the batch) the suffixes -2, -3, ... are tried.
+
+    Parameters
+    ----------
+    items : iterable of (str, str or dict)
+        pairs of pdf path and bibtex entry
+    ext : str, optional
+    maxbytes : int, optional
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        the (source, target) pairs; files which keep their name or have
+        no usable (or malformed) metadata are left out
+
+    """
+    items = sorted(items, key=lambda item: item[0])
+    # existing names per directory, loaded once per directory. The names of
+    # the files in the batch count as taken as well, so the moves can be
+    # executed in any order.
+    taken = {}
+    moves = []
+    for pdf, bibitem in items:
+        try:
+            filename = make_filename(bibitem, ext, maxbytes)
+        except bibtex.BibtexError as e:
+            logger.warning('Malformed metadata for {pdf}: {e}'.format(pdf=pdf, e=e))
+            continue
+        if filename is None:
+            logger.warning('No metadata to rename {pdf}'.format(pdf=pdf))
+            continue
+        directory = os.path.dirname(os.path.abspath(pdf))
+        if directory not in taken:
+            taken[directory] = set(os.listdir(directory))
+        names = taken[directory]
+        if os.path.basename(pdf) == filename:
+            continue
+        candidate = filename
+        n = 1
+        while candidate in names:
+            n += 1
+            candidate = _with_suffix(filename, n, maxbytes)
+        names.add(candidate)
+        moves.append((pdf, os.path.join(os.path.dirname(pdf), candidate)))
+    return moves
+
+
+def _move(src, dst):
+    """Move src to dst atomically, never overwrite dst."""
+    try:
+        # link fails if dst exists, so concurrent runs can't clobber files
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            raise
+        # no hard links on this file system (e.g. FAT), fall back to the
+        # (racy) check and rename.
+        if os.path.lexists(dst):
+            raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        os.rename(src, dst)
+    else:
+        os.unlink(src)
+
+
+def _write_log(moves, undo_log):
+    with open(undo_log, 'a') as f:
+        for src, dst in moves:
+            f.write(json.dumps({'src': src, 'dst': dst}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def execute(moves, undo_log=None):
+    """Execute the moves of a plan.
+
+    Parameters
+    ----------
+    moves : List[Tuple[str, str]]
+        as returned by `plan`
+    undo_log : str, optional
+        path of a file the moves are appended to before they are executed
+
+    Raises
+    ------
+    RenameError
+        if a move fails; all moves done so far are reverted
+
+    """
+    if undo_log is not None:
+        _write_log(moves, undo_log)
+    done = []
+    for src, dst in moves:
+        logger.info('Renaming {in_} to {out}'.format(in_=src, out=dst))
+        try:
+            _move(src, dst)
+        except OSError as e:
+            logger.error('Renaming {in_} failed, rolling back: {e}'.format(in_=src, e=e))
+            for src_, dst_ in reversed(done):
+                _move(dst_, src_)
+            raise RenameError(e.errno, 'Renaming {in_} to {out} failed: {e}'.format(
+                in_=src, out=dst, e=e.strerror))
+        done.append((src, dst))
+
+
+def undo(undo_log):
+    """Revert the moves recorded in undo_log.
+
+    Moves whose target doesn't exist anymore, or whose source has been
+    taken in the meantime, are skipped.
+
+    Returns
+    -------
+    int
+        the number of reverted moves
+
+    """
+    with open(undo_log) as f:
+        moves = [json.loads(line) for line in f if line.strip()]
+    reverted = 0
+    for move in reversed(moves):
+        src, dst = move['src'], move['dst']
+        if not os.path.exists(dst) or os.path.lexists(src):
+            continue
+        logger.info('Renaming {in_} back to {out}'.format(in_=dst, out=src))
+        _move(dst, src)
+        reverted += 1
+    return reverted
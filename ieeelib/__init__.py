@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
 from ieeelib.ieeelib import *
+from ieeelib import keypool
 
 __VERSION__ = '1.0.0'
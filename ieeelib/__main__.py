@@ -2,33 +2,126 @@
 
 import optparse
 import logging
+import json
 import sys
 import os
 
 import ieeelib as ieee
+from ieeelib.keypool import KeyPool, QuotaExhausted, load_key_files
+from sbqt_errors import UnknownContentType
 
 
 logger = logging.getLogger('ieeelib')
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    level=logging.WARNING
-)
+
+FIELDS = {
+    'abstract': ieee.SEARCH_FIELD_ABSTRACT,
+    'title': ieee.SEARCH_FIELD_DOC_TITLE,
+    'publication': ieee.SEARCH_FIELD_PUB_TITLE,
+    'authors': ieee.SEARCH_FIELD_AUTHORS,
+    'affiliations': ieee.SEARCH_FIELD_AFFILIATIONS,
+    'keywords': ieee.SEARCH_FIELD_KEYWORDS,
+}
+
+OPERATORS = {'AND': ieee.AND, 'OR': ieee.OR}
+
+
+def parse_fields(value):
+    """Turn a comma separated list of field names (or a number) into a mask."""
+    if value.isdigit():
+        return int(value)
+    mask = ieee.SEARCH_FIELD_NONE
+    for name in value.split(','):
+        name = name.strip().lower()
+        if name not in FIELDS:
+            raise ValueError("Unknown field: %s" % name)
+        mask |= FIELDS[name]
+    return mask
+
+
+def write_page(page, outformat, out):
+    """Write the articles of a page in the requested format."""
+    if outformat == 'jsonl':
+        for article in page.get("articles", []):
+            out.write(json.dumps(article) + "\n")
+    else:
+        # bibtexparser is only needed (and imported) for bibtex output
+        import bibtexparser
+        import ieeelib.ieeeresultparser as ieeeparser
+        if page.get("articles"):
+            out.write(bibtexparser.dumps(ieeeparser.bibtexize(page)))
+    out.flush()
+
+
+def load_keys(key_files):
+    """Return the API keys from $IEEE_API_KEY (comma separated) or the key files."""
+    env = os.environ.get(ieee.API_KEY_ENV)
+    if env:
+        return [key.strip() for key in env.split(",") if key.strip()]
+    return load_key_files(key_files)
+
+
+def chunk_pages(articles, size):
+    """Group a stream of articles into pages of the given size."""
+    page = []
+    for article in articles:
+        page.append(article)
+        if len(page) >= size:
+            yield {"articles": page}
+            page = []
+    if page:
+        yield {"articles": page}
 
 
 def main():
-    usage = 'Usage: %prog [options] {pdf | "search terms"}'
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)s %(name)s %(message)s',
+        level=logging.WARNING
+    )
+    usage = 'Usage: %prog [options] "search terms"'
     parser = optparse.OptionParser(usage)
-    parser.add_option("-a", "--all", action="store_true", dest="all",
-                      default=False, help="show all bibtex results")
     parser.add_option("-d", "--debug", action="store_true", dest="debug",
                       default=False, help="show debugging output")
-    parser.add_option("-r", "--rename", action="store_true", dest="rename",
-                      default=False, help="rename file")
-    parser.add_option("-f", "--outputformat", dest='output',
-                      default="bibtex",
-                      help="Output format. Available formats are: bibtex, endnote, refman, wenxianwang [default: %default]")
-    parser.add_option("-s", "--startpage", dest='startpage',
-                      help="Page number to start parsing PDF file at.")
+    parser.add_option("-m", "--fields", dest="fields", default="abstract",
+                      help="comma separated fields to search in: %s, or a numeric "
+                           "fields mask [default: %%default]" % ", ".join(sorted(FIELDS)))
+    parser.add_option("-o", "--operator", dest="operator", default="AND",
+                      choices=sorted(OPERATORS),
+                      help="operator combining the fields: AND or OR [default: %default]")
+    parser.add_option("-y", "--start-year", dest="start_year", type="int",
+                      help="only return records published in or after this year")
+    parser.add_option("-k", "--key-file", dest="key_files", action="append",
+                      help="file with API keys (one per line), can be given several times; "
+                           "used if $%s (comma separated keys) is not set "
+                           "[default: api-keys/ieee.key]" % ieee.API_KEY_ENV)
+    parser.add_option("--usage-file", dest="usage_file",
+                      default=os.path.join("api-keys", "ieee.usage.json"),
+                      help="file the per-key call counters are kept in, shared between "
+                           "processes [default: %default, if the directory exists]")
+    parser.add_option("--calls-per-day", dest="calls_per_day", type="int",
+                      default=ieee.keypool.CALLS_PER_DAY,
+                      help="daily quota of each key [default: %default]")
+    parser.add_option("--wait-for-reset", action="store_true", dest="wait_for_reset",
+                      default=False,
+                      help="if all keys are over their daily quota, pause until the "
+                           "quota is reset instead of aborting")
+    parser.add_option("-n", "--max-records", dest="max_records", type="int",
+                      default=ieee.MAX_RECORDS,
+                      help="number of records per page [default: %default]")
+    parser.add_option("-l", "--limit", dest="limit", type="int",
+                      help="stop after this many records")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=ieee.DEFAULT_JOBS,
+                      help="number of pages fetched concurrently [default: %default]")
+    parser.add_option("--rate", dest="rate", type="float",
+                      help="maximal number of requests per second [default: %s per key]"
+                           % ieee.DEFAULT_RATE)
+    parser.add_option("--state", dest="state", metavar="FILE",
+                      help="incremental mode: only output records which are new or changed "
+                           "since the last run with this state file (--limit is ignored)")
+    parser.add_option("-f", "--outputformat", dest="output", default="bibtex",
+                      choices=["bibtex", "jsonl"],
+                      help="Output format. Available formats are: bibtex, jsonl [default: %default]")
+    parser.add_option("-w", "--write", dest="outfile",
+                      help="write the results to this file instead of stdout")
     parser.add_option('-V', '--version', action='store_true',
                       help='Print version and quit.')
 
@@ -38,42 +131,66 @@ def main():
     if options.version:
         print(ieee.__VERSION__)
         return
-    if options.output == 'bibtex':
-        outformat = ieee.FORMAT_BIBTEX
-    elif options.output == 'endnote':
-        outformat = ieee.FORMAT_ENDNOTE
-    elif options.output == 'refman':
-        outformat = ieee.FORMAT_REFMAN
-    elif options.output == 'wenxianwang':
-        outformat = ieee.FORMAT_WENXIANWANG
     if len(args) != 1:
         parser.error("No argument given, nothing to do.")
+    try:
+        fields_mask = parse_fields(options.fields)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        keys = load_keys(options.key_files or [os.path.join("api-keys", "ieee.key")])
+    except IOError as e:
+        print("Could not load the API key: %s" % e, file=sys.stderr)
         sys.exit(1)
-    args = args[0]
-    pdfmode = False
-    if os.path.exists(args):
-        logger.debug("File exist, assuming you want me to lookup the pdf: {filename}.".format(filename=args))
-        pdfmode = True
-        biblist = ieee.pdflookup(args, all, outformat, options.startpage)
-    else:
-        logger.debug("Assuming you want me to lookup the query: {query}".format(query=args))
-        biblist = ieee.query(args, outformat, options.all)
-    if len(biblist) < 1:
-        print("No results found, try again with a different query!")
+    if not keys:
+        print("No API key given.", file=sys.stderr)
         sys.exit(1)
-    if options.all is True:
-        logger.debug("All results:")
-        for i in biblist:
-            print(i)
-    else:
-        logger.debug("First result:")
-        print(biblist[0])
-    if options.rename is True:
-        if not pdfmode:
-            print("You asked me to rename the pdf but didn't tell me which file to rename, aborting.")
-            sys.exit(1)
+    usage_file = options.usage_file
+    if not os.path.isdir(os.path.dirname(usage_file) or "."):
+        usage_file = None
+    api_key = KeyPool(keys, usage_file, calls_per_day=options.calls_per_day,
+                      wait_for_reset=options.wait_for_reset)
+
+    from querylib.http import Session
+    session = Session(rate=options.rate or ieee.DEFAULT_RATE * len(keys))
+    out = open(options.outfile, "w") if options.outfile else sys.stdout
+    records = 0
+    state = None
+    try:
+        if options.state:
+            from ieeelib.delta import DeltaState, query_new
+            state = DeltaState(options.state)
+            articles = query_new(args[0], state, api_key, options.max_records, options.start_year,
+                                 fields_mask, OPERATORS[options.operator], session)
+            pages = chunk_pages(articles, options.max_records)
         else:
-            ieee.rename_file(args, biblist[0])
+            pages = ieee.query_pages(args[0], api_key, options.max_records, options.start_year,
+                                     fields_mask, OPERATORS[options.operator], options.limit,
+                                     options.jobs, session)
+        for page in pages:
+            if records == 0:
+                logger.debug("Total records: {total}".format(total=page.get("total_records")))
+            records += len(page.get("articles", []))
+            write_page(page, options.output, out)
+        if state is not None:
+            state.save()
+    except QuotaExhausted as e:
+        print("%s Stopped after %d records." % (e, records), file=sys.stderr)
+        sys.exit(1)
+    except UnknownContentType as e:
+        print("%s Stopped after %d records." % (e, records), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        session.close()
+        if out is not sys.stdout:
+            out.close()
+    if records == 0 and state is not None:
+        print("No new records.", file=sys.stderr)
+        return
+    if records == 0:
+        print("No results found, try again with a different query!", file=sys.stderr)
+        sys.exit(1)
+    logger.debug("Wrote {n} records.".format(n=records))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,56 @@
+"""
+IEEE Xplore as a querylib.backends.Backend.
+"""
+
+import json
+
+from querylib import qc, canonical
+from querylib.backends import Backend, Page, register, make_record
+from querylib.hooks import span
+
+from ieeelib import ieeelib as ieee
+
+
+@register
+class IEEEBackend(Backend):
+    """
+    IEEE Xplore, via its REST API. Needs an API key (or a ieeelib.keypool.KeyPool).
+
+    The pages are parsed into records, each keeping the article as returned by the API in "raw".
+    """
+    name = 'ieee'
+    label = qc.IEEE
+    page_size = ieee.MAX_RECORDS
+    rate = ieee.DEFAULT_RATE
+    syntax = canonical.IEEE
+
+    def __init__(self, api_key="", fields_mask=ieee.SEARCH_FIELD_ABSTRACT, operator=ieee.AND, start_year=None,
+                 max_records=ieee.MAX_RECORDS):
+        self.api_key = api_key
+        self.page_size = max_records
+        self.fields_mask = fields_mask
+        self.operator = operator
+        self.start_year = start_year
+        if hasattr(api_key, "acquire"):
+            # every key of a pool may be used at the full rate
+            self.rate = ieee.DEFAULT_RATE * len(api_key)
+
+    def fetch(self, query, start, count, session):
+        return ieee.query(query, self.api_key, start + 1, count, self.start_year, self.fields_mask, self.operator, session)
+
+    def cache_key(self):
+        return (self.name, self.fields_mask, self.operator, self.start_year)
+
+    def parse(self, raw):
+        with span('ieeelib.json', bytes=len(raw)):
+            data = json.loads(raw)
+        records = []
+        for article in data.get("articles", []):
+            authors = article.get("authors", {}).get("authors", [])
+            records.append(make_record(
+                'ieee', "ieee" + str(article.get("article_number")), article.get("title"),
+                [a.get("full_name") for a in authors],
+                article.get("publication_year"), article.get("doi"),
+                article.get("publication_title"),
+                article.get("html_url") or article.get("pdf_url"), article))
+        return Page(records, data.get("total_records", 0))
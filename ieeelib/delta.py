@@ -0,0 +1,127 @@
+"""
+Incremental IEEE Xplore queries: only fetch records added since the last run.
+
+A DeltaState stores the high-water mark of a query, i.e. the latest
+publication year seen and a fingerprint of every article seen so far. The
+next run only asks for records from that year on and returns those which
+are not known yet or have changed. The API returns the records of a year
+in no fixed order, so all pages of that range are fetched; a page of known
+records doesn't mean no new ones follow.
+"""
+
+import os
+import re
+import json
+import zlib
+import logging
+
+from ieeelib.ieeelib import query_pages, MAX_RECORDS, SEARCH_FIELD_ABSTRACT, AND
+
+logger = logging.getLogger(__name__)
+
+YEAR_PATTERN = re.compile(r'\d{4}')
+
+
+def publication_year(article):
+    """
+    Return the publication year of the given article as int, or None.
+    """
+    year = article.get("publication_year") or article.get("publication_date")
+    match = YEAR_PATTERN.search(str(year or ""))
+    if match:
+        return int(match.group())
+    return None
+
+
+# the bibliographic fields of an article; the API also returns fields which
+# change all the time (rank, citing_paper_count, ...), which must not make a
+# record look changed
+FINGERPRINT_FIELDS = ("title", "authors", "doi", "publication_title", "content_type", "volume", "issue",
+                      "start_page", "end_page", "publication_year", "publication_date", "conference_dates")
+
+
+def fingerprint(article):
+    """
+    Return a checksum of the bibliographic fields of the given article (a dict as returned by the API), used to detect changed records.
+    """
+    fields = dict((name, article.get(name)) for name in FINGERPRINT_FIELDS)
+    return zlib.crc32(json.dumps(fields, sort_keys=True).encode("utf8")) & 0xffffffff
+
+
+class DeltaState(object):
+    """
+    The high-water mark of a query, stored as json in the file path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.latest_year = None
+        self.seen = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.latest_year = data.get("latest_year")
+            self.seen = data.get("seen", {})
+
+    def is_new(self, article):
+        """
+        Return True if the article was not seen before or has changed since, and remember it.
+        """
+        number = str(article.get("article_number"))
+        fp = fingerprint(article)
+        if self.seen.get(number) == fp:
+            return False
+        self.seen[number] = fp
+        year = publication_year(article)
+        if year and (self.latest_year is None or year > self.latest_year):
+            self.latest_year = year
+        return True
+
+    def save(self):
+        """
+        Write the state to disk (atomically, so an interrupted run keeps the old state).
+        """
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"latest_year": self.latest_year, "seen": self.seen}, f)
+        os.replace(tmp, self.path)
+
+
+def query_new(search_str, state, api_key="", max_records=MAX_RECORDS, start_year=None, fields_mask=SEARCH_FIELD_ABSTRACT, operator=AND, session=None):
+    """Yield the articles of a query which are new or changed since the last run.
+
+    Parameters
+    ----------
+    search_str : str
+        the query
+    state : DeltaState
+        the state of the query, updated with the returned articles (call
+        `state.save()` once they are stored)
+    api_key : str
+        the key to be able to use IEEE's API
+    max_records : int, optional
+        the number of records per page
+    start_year : int, optional
+        never go further back than this year
+    fields_mask : int, optional
+        the fields to search in, see SEARCH_FIELD_*
+    operator : str, optional
+        how the fields are combined (AND or OR)
+    session : querylib.http.Session, optional
+        session to send the requests with
+
+    Yields
+    ------
+    dict
+        the new or changed articles
+    """
+    if state.latest_year is not None:
+        # records of the latest year may still be added, so that year is
+        # fetched again
+        start_year = max(start_year or 0, state.latest_year)
+
+    pages = query_pages(search_str, api_key, max_records, start_year, fields_mask, operator, session=session)
+    for page in pages:
+        for article in page.get("articles", []):
+            if state.is_new(article):
+                yield article
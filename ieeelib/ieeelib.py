@@ -6,14 +6,15 @@ Call the method query with a string which contains the full search
 string. Query will return a list of citations.
 """
 
-from urllib.request import Request, urlopen, quote
-from html.entities import name2codepoint
+from urllib.parse import quote
 
-import re
-import os
-import subprocess
+import time
 import logging
 
+from querylib.hooks import span
+from querylib.http import fetch
+from querylib.canonical import canonical_query, SingleFlight, IEEE as IEEE_SYNTAX
+
 IEEE_API_VERSION = 1
 IEEE_URL = "http://ieeexploreapi.ieee.org/api/v%s/search/articles" % IEEE_API_VERSION
 
@@ -30,10 +31,25 @@ SEARCH_FIELDS = {SEARCH_FIELD_ABSTRACT:'"Abstract"', SEARCH_FIELD_DOC_TITLE:'"Do
 AND = " AND "
 OR = " OR "
 
+SORT_FIELD_ARTICLE_NUMBER = "article_number"
+SORT_FIELD_ARTICLE_TITLE = "article_title"
+SORT_FIELD_PUBLICATION_YEAR = "publication_year"
+SORT_ASC = "asc"
+SORT_DESC = "desc"
+
 HEADERS = {'User-Agent': 'Mozilla/5.0'}
 
+MAX_RECORDS = 200 # maximum number of records per page allowed by IEEE
+# requests per second, IEEE allows 10 calls per second
+DEFAULT_RATE = 10
+DEFAULT_JOBS = 4
+
+API_KEY_ENV = "IEEE_API_KEY"
+
 logger = logging.getLogger(__name__)
 
+_flight = SingleFlight()
+
 def determine_query_fields(fields_mask):
     """
     Determine which fields should be used in the query. 
@@ -72,7 +88,7 @@ def populate_query_fields(fields, search_str, operator):
     return query[:-len_op]
 
 
-def query(search_str, api_key="", start_record=1, max_records=200, start_year=None, fields_mask=SEARCH_FIELD_ABSTRACT, operator=AND):
+def query(search_str, api_key="", start_record=1, max_records=MAX_RECORDS, start_year=None, fields_mask=SEARCH_FIELD_ABSTRACT, operator=AND, session=None, sort_field=None, sort_order=None):
     """Query IEEE Xplore.
 
     This method queries IEEE Xplore and returns a json string with the result. 
@@ -81,12 +97,25 @@ def query(search_str, api_key="", start_record=1, max_records=200, start_year=No
     ----------
     search_str : str
         the query
-    api_key : str
-        the key to be able to use IEEE's API
+    api_key : str or ieeelib.keypool.KeyPool
+        the key to be able to use IEEE's API, or a pool of keys. With a pool,
+        a key over its quota (HTTP 403) is retried with the next key.
     start_record : int, optional
         the index of the first record which should be retrieved (used to "browse" through results)
     max_records : int, optional
         the number of records to return (default is 200, the maximum currently allowed by IEEE).
+    start_year : int, optional
+        only return records published in or after this year
+    fields_mask : int, optional
+        the fields to search in, see SEARCH_FIELD_*
+    operator : str, optional
+        how the fields are combined (AND or OR)
+    session : querylib.http.Session, optional
+        session to send the request with (keeps the connection open)
+    sort_field : str, optional
+        sort the records by this field, see SORT_FIELD_*
+    sort_order : str, optional
+        SORT_ASC or SORT_DESC
 
     Returns
     -------
@@ -113,17 +142,92 @@ def query(search_str, api_key="", start_record=1, max_records=200, start_year=No
     else:
         start_year_str = ""
 
-    api_str = "&apikey=%s" % quote(api_key) # last param in URL
-    
-    params = start_year_str + max_records_str + start_record_str
-    url = IEEE_URL + query_str + params  + api_str
+    sort_str = ""
+    if sort_field:
+        sort_str = "&sort_field=%s" % quote(sort_field)
+    if sort_order:
+        sort_str += "&sort_order=%s" % quote(sort_order)
+
+    params = start_year_str + max_records_str + start_record_str + sort_str
+    url = IEEE_URL + query_str + params
     #print("DEBUG: Query URL:", url)
     
     header = HEADERS
     #header['Cookie'] = "GSP=CF=%d" % outformat for google scholar
-    request = Request(url, headers=header)
-    response = urlopen(request)
-
-    json = response.read()
+    # equivalent queries running at the same time are only sent once
+    key = (canonical_query(search_str, IEEE_SYNTAX), fields_mask, operator, start_year, start_record, max_records,
+           sort_field, sort_order)
+    with span('ieeelib.query', query=search_str, start_record=start_record) as s:
+        json, retries = _flight.do(key, _request, url, header, api_key, session)
+        s.set('retries', retries)
     return json
 
+
+def _request(url, header, api_key, session=None):
+    """
+    Fetch url with the given key, or with a key of the given pool, return the body and the number of retries.
+    """
+    pool = api_key if hasattr(api_key, "acquire") else None
+    retries = 0
+    while True:
+        key = pool.acquire() if pool is not None else api_key
+        api_str = "&apikey=%s" % quote(key) # last param in URL
+        try:
+            return fetch(url + api_str, header, session, IEEE_URL), retries
+        except OSError as e:
+            # IEEE answers with 403 if the key is over its quota
+            if pool is None or getattr(e, "code", None) != 403 or retries >= len(pool):
+                raise
+            headers = getattr(e, "headers", None) or {}
+            if "OVER_QPS" in headers.get("X-Mashery-Error-Code", ""):
+                # only over the per-second limit, try again in a second
+                time.sleep(1)
+            else:
+                logger.warning("API key over quota, switching keys: {e}".format(e=e))
+                pool.exhausted(key)
+            retries += 1
+
+
+def query_pages(search_str, api_key="", max_records=MAX_RECORDS, start_year=None, fields_mask=SEARCH_FIELD_ABSTRACT, operator=AND, limit=None, jobs=DEFAULT_JOBS, session=None):
+    """Query IEEE Xplore and page through all results.
+
+    The paging is done by `querylib.backends.pages` with an IEEEBackend:
+    the first page is fetched to learn the total number of records, the
+    remaining pages are fetched concurrently. The pages are yielded in
+    order, each as soon as it and all pages before it have arrived.
+
+    Parameters
+    ----------
+    search_str : str
+        the query
+    api_key : str or ieeelib.keypool.KeyPool
+        the key to be able to use IEEE's API, or a pool of keys the pages
+        are spread over
+    max_records : int, optional
+        the number of records per page (at most 200)
+    start_year : int, optional
+        only return records published in or after this year
+    fields_mask : int, optional
+        the fields to search in, see SEARCH_FIELD_*
+    operator : str, optional
+        how the fields are combined (AND or OR)
+    limit : int, optional
+        stop after this many records
+    jobs : int, optional
+        number of pages fetched concurrently
+    session : querylib.http.Session, optional
+        session to send the requests with, by default a new one limited
+        to DEFAULT_RATE requests per second (per key of a pool)
+
+    Yields
+    ------
+    dict
+        each page as {"total_records": ..., "articles": [...]}, the
+        articles decoded from the json
+    """
+    from ieeelib.backend import IEEEBackend
+    from querylib.backends import pages
+
+    backend = IEEEBackend(api_key, fields_mask, operator, start_year, max_records)
+    for page in pages(backend, search_str, limit, jobs, session):
+        yield {"total_records": page.total, "articles": [record["raw"] for record in page.records]}
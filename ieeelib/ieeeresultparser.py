@@ -2,25 +2,192 @@
 A library to parse the json results returned from the IEEE Xplore API.
 """
 
+import os
 import re
+import sys
 import json
+import itertools
 import bibtexparser
 
-from utils import dotdict
+from ieeelib.record import iter_articles
+from querylib.hooks import span
+from querylib.tasks import bounded
 from sbqt_errors import *
 
 
+# number of articles a worker converts at a time
+CHUNK_SIZE = 2000
+
+
 def __main__():
-    testfile = "5G_sec.json"
+    import optparse
+    parser = optparse.OptionParser('Usage: %prog [options] [dump.json]')
+    parser.add_option("-w", "--write", dest="outfile", default="foo.bib",
+                      help="the bibtex file to write [default: %default]")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+                      help="number of processes converting the articles, 0 for one per core "
+                           "[default: %default]")
+    parser.add_option("--chunk-size", dest="chunk_size", type="int", default=CHUNK_SIZE,
+                      help="number of articles per chunk handed to a process [default: %default]")
+    (options, args) = parser.parse_args()
+    testfile = args[0] if args else "5G_sec.json"
+
+    with open(testfile, "rt") as f, open(options.outfile, "w") as bf:
+        try:
+            for text in dumps_parallel(read_articles(f), options.jobs or None, options.chunk_size):
+                bf.write(text)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            exit(UNKNOWN_ARTICLE_TYPE_ERROR)
 
-    with open(testfile, "rt") as f:
-        # parse json into python objects
-        data = json.load(f)
 
-    bibtex_db = bibtexize(data)
-    
-    with open("foo.bib", "w") as bf:
-        bibtexparser.dump(bibtex_db, bf)
+# whitespace between json tokens
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _skip(text, pos, separator=None):
+    """
+    Return the position of the next json token after pos, skipping one separator (e.g. "," or ":") if it is there.
+    """
+    pos = _WHITESPACE.match(text, pos).end()
+    if separator is not None and text.startswith(separator, pos):
+        pos = _WHITESPACE.match(text, pos + 1).end()
+    return pos
+
+
+def _is_page(line):
+    """
+    Return True if line starts a json page (an object with "articles", or one continuing on the next line), False
+    if it holds a single article. Only the values before "articles" are decoded.
+    """
+    decoder = json.JSONDecoder()
+    pos = _skip(line, 0)
+    if not line.startswith("{", pos):
+        raise ValueError("Neither a json page nor json lines.")
+    pos = _skip(line, pos + 1)
+    while pos < len(line) and line[pos] != "}":
+        try:
+            key, pos = decoder.raw_decode(line, pos)
+            if key == "articles":
+                return True
+            _, pos = decoder.raw_decode(line, _skip(line, pos, ":"))
+        except ValueError:
+            # the object continues on the next line
+            return True
+        pos = _skip(line, pos, ",")
+    return pos >= len(line)
+
+
+def _page_articles(text):
+    """
+    Yield the json of every article of a json page, decoding one article at a time to find where it ends.
+    """
+    decoder = json.JSONDecoder()
+    try:
+        pos = _skip(text, _skip(text, 0), "{")
+        while text[pos] != "}":
+            key, pos = decoder.raw_decode(text, pos)
+            pos = _skip(text, pos, ":")
+            if key == "articles":
+                pos = _skip(text, pos, "[")
+                while text[pos] != "]":
+                    _, end = decoder.raw_decode(text, pos)
+                    yield text[pos:end]
+                    pos = _skip(text, end, ",")
+                pos += 1
+            else:
+                _, pos = decoder.raw_decode(text, pos)
+            pos = _skip(text, pos, ",")
+    except IndexError:
+        raise ValueError("Unterminated json page.")
+
+
+def read_articles(f):
+    """
+    Yield the json of the articles of a saved dump: a json page as returned by the API, or one article per line (as
+    written by ieeelib -f jsonl). The format is told by the first line. The articles are yielded undecoded,
+    dumps_parallel decodes them in the workers, so the parent never holds a decoded page.
+    """
+    first = f.readline()
+    while first and not first.strip():
+        first = f.readline()
+    if not first:
+        return iter(())
+    if _is_page(first):
+        return _page_articles(first + f.read())
+    return itertools.chain([first], (line for line in f if line.strip()))
+
+
+def _dumps_chunk(articles):
+    """
+    Convert a chunk of articles (dicts or json strings) into a single bibtex string, run in the worker processes.
+    """
+    articles = [json.loads(a) if isinstance(a, str) else a for a in articles]
+    db = bibtexize({"articles": articles})
+    writer = bibtexparser.bwriter.BibTexWriter()
+    # keep the order of the input
+    writer.order_entries_by = None
+    return writer.write(db)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def dumps_parallel(articles, jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    Convert the articles into bibtex in a pool of processes, yielding the bibtex of one chunk of articles at a time.
+
+    The chunks are yielded in the order of the articles, and "".join() of them is the bibtex of all articles (in
+    input order, unlike bibtexparser.dumps, which sorts by ID). At most 2 * jobs chunks are in flight, so the
+    articles can be a stream, e.g. the lines of a jsonl file: json strings are decoded by the workers, and each
+    worker returns one string per chunk, which keeps the data sent between the processes small.
+
+    Parameters
+    ----------
+    articles : iterable of dict or str
+        the articles as returned by the API, or their json
+    jobs : int, optional
+        number of processes, by default one per core. With 1 the chunks are
+        converted in this process.
+    chunk_size : int, optional
+        number of articles per chunk
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        # the same conversion and merging, in this process
+        with span('ieeeresultparser.dumps_parallel', jobs=jobs) as s:
+            first = True
+            nr_of_chunks = 0
+            for chunk in _chunks(articles, chunk_size):
+                text = _dumps_chunk(chunk)
+                if text:
+                    yield text if first else "\n" + text
+                    first = False
+                nr_of_chunks += 1
+            s.set('chunks', nr_of_chunks)
+        return
+    with span('ieeeresultparser.dumps_parallel', jobs=jobs) as s:
+        with ProcessPoolExecutor(jobs) as executor:
+            first = True
+            nr_of_chunks = 0
+            for _, future in bounded(executor, _dumps_chunk, _chunks(articles, chunk_size), 2 * jobs):
+                text = future.result()
+                if text:
+                    yield text if first else "\n" + text
+                    first = False
+                nr_of_chunks += 1
+        s.set('chunks', nr_of_chunks)
+
 
 def append_to_bibfile(bibtex_db, filepath):
     """
@@ -33,28 +200,27 @@ def append_to_bibfile(bibtex_db, filepath):
 def bibtexize(data):
     """
     Takes the given json data (from IEEE Xplore's API), and returns a corresponding bibtex string.
-    """
-    ieee_data = dotdict(data)
-    # ieee_data has 3 entries: total_records, total_searched and articles
 
-    articles = ieee_data.articles
+    The articles may be dicts as returned by the API or ieeelib.record.Article. Raises UnknownContentType for an
+    article which is neither a journal article, a conference paper nor a book.
+    """
+    # data has 3 entries: total_records, total_searched and articles
     entries = []
     
-    for a in articles:
-        a = dotdict(a)
-
-        if a.content_type == "Journals" or a.content_type == "Early Access":
-            bibtex = load_journal(a)
-            entries.append(bibtex)
-        elif a.content_type == "Books":
-            bibtex = load_book(a)
-            entries.append(bibtex)
-        elif a.content_type == "Conferences":
-            bibtex = load_inproceeding(a)
-            entries.append(bibtex)
-        else:
-            print("Unknown content type while parsing IEEE data (json). Aborting.", file=sys.stderr)
-            exit(UNKNOWN_ARTICLE_TYPE_ERROR)
+    with span('ieeeresultparser.bibtexize') as s:
+        for a in iter_articles(data):
+            if a.content_type == "Journals" or a.content_type == "Early Access":
+                bibtex = load_journal(a)
+                entries.append(bibtex)
+            elif a.content_type == "Books":
+                bibtex = load_book(a)
+                entries.append(bibtex)
+            elif a.content_type == "Conferences":
+                bibtex = load_inproceeding(a)
+                entries.append(bibtex)
+            else:
+                raise UnknownContentType("Unknown content type %r of article %s." % (a.content_type, a.article_number))
+        s.set('records', len(entries))
 
     db = bibtexparser.bibdatabase.BibDatabase()
     db.entries = entries
@@ -88,11 +254,9 @@ def load_journal(entry):
     bibdict["title"] = str(entry.title)
     bibdict["abstract"] = str(entry.abstract)
     
-    authors = [ a["full_name"] for a in entry.authors["authors"] ]
-    bibdict["authors"] = (''.join('%s, ' % a for a in authors))[:-2]
+    bibdict["authors"] = (''.join('%s, ' % a for a in entry.authors))[:-2]
 
-    affiliations = [ a["affiliation"] if "affiliation" in a.keys() else None for a in entry.authors["authors"]]
-    bibdict["affiliations"] = (''.join('%s, ' % a for a in affiliations))[:-2]
+    bibdict["affiliations"] = (''.join('%s, ' % a for a in entry.affiliations))[:-2]
     
     bibdict["doi"] = str(entry.doi)
     bibdict["booktitle"] = str(entry.publication_title)
@@ -104,9 +268,9 @@ def load_journal(entry):
     bibdict["publisher"] = str(entry.publisher)
     bibdict["pages"] = "%s -- %s" % (entry.start_page, entry.end_page)
     
-    if "author_terms" in entry.index_terms.keys():
-        keywords = entry.index_terms["author_terms"]["terms"] # list of author-provided keywords
-        bibdict["keywords"] = (''.join('%s, ' % a for a in keywords))[:-2]
+    if entry.keywords is not None:
+        # author-provided keywords
+        bibdict["keywords"] = (''.join('%s, ' % a for a in entry.keywords))[:-2]
 
     bibdict["pdfurl"] = str(entry.pdf_url)
 
@@ -128,11 +292,9 @@ def load_inproceeding(entry):
     bibdict["title"] = str(entry.title)
     bibdict["abstract"] = str(entry.abstract)
 
-    authors = [ a["full_name"] for a in entry.authors["authors"] ]
-    bibdict["authors"] = (''.join('%s, ' % a for a in authors))[:-2]
+    bibdict["authors"] = (''.join('%s, ' % a for a in entry.authors))[:-2]
 
-    affiliations = [ a["affiliation"] if "affiliation" in a.keys() else None for a in entry.authors["authors"]]
-    bibdict["affiliations"] = (''.join('%s, ' % a for a in affiliations))[:-2]
+    bibdict["affiliations"] = (''.join('%s, ' % a for a in entry.affiliations))[:-2]
     
     bibdict["doi"] = str(entry.doi)
     bibdict["booktitle"] = str(entry.publication_title)
@@ -145,9 +307,9 @@ def load_inproceeding(entry):
     bibdict["publisher"] = str(entry.publisher)
     bibdict["pages"] = "%s -- %s" % (entry.start_page, entry.end_page)
     
-    if "author_terms" in entry.index_terms.keys():
-        keywords = entry.index_terms["author_terms"]["terms"] # list of author-provided keywords
-        bibdict["keywords"] = (''.join('%s, ' % a for a in keywords))[:-2]
+    if entry.keywords is not None:
+        # author-provided keywords
+        bibdict["keywords"] = (''.join('%s, ' % a for a in entry.keywords))[:-2]
 
     bibdict["pdfurl"] = str(entry.pdf_url)
 
@@ -168,8 +330,7 @@ def load_book(entry):
 
     bibdict["title"] = str(entry.publication_title)
 
-    authors = [ a["full_name"] for a in entry.authors["authors"] ]
-    bibdict["authors"] = (''.join('%s, ' % a for a in authors))[:-2]
+    bibdict["authors"] = (''.join('%s, ' % a for a in entry.authors))[:-2]
 
     bibdict["doi"] = str(entry.doi)
     bibdict["chapter"] = str(entry.title)
@@ -0,0 +1,198 @@
+"""
+A pool of IEEE Xplore API keys with per-key quotas.
+
+Every key may be used for a limited number of calls per second and per
+day. `KeyPool.acquire` hands out the key with the most quota left (so
+concurrent page fetches are spread over all keys), waits if all keys are
+at their per-second limit, and, once all keys are used up for the day,
+either waits for the quota to reset or raises QuotaExhausted.
+
+The counters are stored in a json file (keys are only stored as hashes).
+The file is locked while it is updated, so several processes can share a
+pool.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking (e.g. on windows), the pool is only safe within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CALLS_PER_SECOND = 10
+CALLS_PER_DAY = 200
+
+
+class QuotaExhausted(RuntimeError):
+    """
+    Raised if all keys of a pool have used up their daily quota.
+    """
+
+
+def _today():
+    """
+    Return the current (UTC) day, the daily quotas are reset at midnight UTC.
+    """
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def _seconds_until_tomorrow():
+    now = time.time()
+    return 86400 - now % 86400
+
+
+class KeyPool(object):
+    """
+    A pool of API keys, which can be passed as api_key to ieeelib.query.
+
+    Parameters
+    ----------
+    keys : list of str
+        the API keys
+    counter_file : str, optional
+        json file to persist the counters in, shared between processes
+    calls_per_second : int, optional
+        the per-second quota of each key
+    calls_per_day : int, optional
+        the daily quota of each key
+    wait_for_reset : bool, optional
+        if all keys are exhausted, sleep until the quotas are reset
+        instead of raising QuotaExhausted
+    """
+
+    def __init__(self, keys, counter_file=None, calls_per_second=CALLS_PER_SECOND, calls_per_day=CALLS_PER_DAY, wait_for_reset=False):
+        if not keys:
+            raise ValueError("A key pool needs at least one key.")
+        self.keys = list(keys)
+        self.counter_file = counter_file
+        self.calls_per_second = calls_per_second
+        self.calls_per_day = calls_per_day
+        self.wait_for_reset = wait_for_reset
+        self._lock = threading.Lock()
+        self._ids = dict((key, hashlib.sha1(key.encode("utf8")).hexdigest()[:16]) for key in self.keys)
+        self._counters = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _load(self, f):
+        if f is None:
+            return self._counters
+        f.seek(0)
+        data = f.read()
+        return json.loads(data) if data else {}
+
+    def _store(self, f, counters):
+        if f is None:
+            self._counters = counters
+            return
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(counters))
+        f.flush()
+
+    def _update(self, update):
+        """
+        Run update(counters) on the current counters while holding the (file) lock and store the result.
+        """
+        with self._lock:
+            f = None
+            if self.counter_file is not None:
+                f = open(self.counter_file, "a+")
+            try:
+                if f is not None and fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                counters = self._load(f)
+                result = update(counters)
+                self._store(f, counters)
+                return result
+            finally:
+                if f is not None:
+                    f.close()
+
+    def _counter(self, counters, key, today):
+        counter = counters.setdefault(self._ids[key], {"day": today, "calls": 0, "recent": []})
+        if counter["day"] != today:
+            counter["day"] = today
+            counter["calls"] = 0
+        return counter
+
+    def _try_acquire(self, counters):
+        """
+        Pick a key and count the call, returns (key, None) or (None, seconds to wait).
+        """
+        now = time.time()
+        today = _today()
+        candidates = []
+        wait = None
+        for key in self.keys:
+            counter = self._counter(counters, key, today)
+            counter["recent"] = [t for t in counter["recent"] if t > now - 1]
+            if counter["calls"] >= self.calls_per_day:
+                continue
+            if len(counter["recent"]) >= self.calls_per_second:
+                free_in = counter["recent"][0] + 1 - now
+                wait = free_in if wait is None else min(wait, free_in)
+                continue
+            candidates.append((len(counter["recent"]), counter["calls"], key))
+        if candidates:
+            _, _, key = min(candidates)
+            counter = counters[self._ids[key]]
+            counter["calls"] += 1
+            counter["recent"].append(now)
+            return key, None
+        return None, wait
+
+    def acquire(self):
+        """
+        Return a key with quota left and count one call for it.
+
+        Blocks while all keys are at their per-second limit. Raises QuotaExhausted if all keys have used
+        up their daily quota (or waits for the reset if wait_for_reset is set).
+        """
+        while True:
+            key, wait = self._update(self._try_acquire)
+            if key is not None:
+                return key
+            if wait is None:
+                # every key is over its daily quota
+                if not self.wait_for_reset:
+                    raise QuotaExhausted("All %d API keys have used up their daily quota." % len(self.keys))
+                wait = _seconds_until_tomorrow()
+                logger.warning("All API keys are exhausted, pausing for {s:.0f} seconds.".format(s=wait))
+            time.sleep(max(wait, 0.001))
+
+    def exhausted(self, key):
+        """
+        Mark key as used up for today (e.g. because the API says so).
+        """
+        def update(counters):
+            self._counter(counters, key, _today())["calls"] = self.calls_per_day
+        self._update(update)
+
+    def remaining(self):
+        """
+        Return the number of calls left today, summed over all keys.
+        """
+        def update(counters):
+            today = _today()
+            return sum(max(self.calls_per_day - self._counter(counters, key, today)["calls"], 0) for key in self.keys)
+        return self._update(update)
+
+
+def load_key_files(paths):
+    """
+    Read API keys from the given files (one key per non-empty line).
+    """
+    keys = []
+    for path in paths:
+        with open(path, "r") as f:
+            keys.extend(line.strip() for line in f if line.strip())
+    return keys
@@ -0,0 +1,91 @@
+"""
+A compact representation of the articles returned by the IEEE Xplore API.
+
+The decoded JSON of an article is a dict with nested dicts and lists for
+the authors and index terms, several kilobytes per article. An Article
+keeps the same information in fixed slots: authors, affiliations and
+keywords become tuples, and values which repeat across many articles
+(publisher, publication title, content type, ...) are interned so that all
+articles share a single copy. This holds several times more articles per
+GB, which matters when 10^5 or more are kept for deduplication and export.
+
+Fields the API didn't return are None. Articles are converted one at a
+time, as they are iterated over (see `iter_articles`), so a page is never
+held as dicts and Articles at the same time.
+"""
+
+import sys
+
+
+def _intern(value):
+    """
+    Return the shared copy of value if it is a string.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class Article(object):
+    """
+    One article, see the IEEE Xplore API documentation for the meaning of the fields.
+    """
+
+    # fields copied as they are
+    FIELDS = ("article_number", "title", "abstract", "doi", "start_page", "end_page", "pdf_url")
+    # fields with few distinct values, which are interned
+    SHARED_FIELDS = ("content_type", "publication_title", "publisher", "conference_location",
+                     "conference_dates", "publication_date", "issn", "isbn", "issue",
+                     "publication_number", "volume")
+
+    __slots__ = FIELDS + SHARED_FIELDS + ("authors", "affiliations", "keywords")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError("Unknown fields: %s" % ", ".join(sorted(fields)))
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Create an Article from the (decoded) json of an article as returned by the API.
+        """
+        article = cls.__new__(cls)
+        get = data.get
+        for name in cls.FIELDS:
+            setattr(article, name, get(name))
+        for name in cls.SHARED_FIELDS:
+            setattr(article, name, _intern(get(name)))
+        authors = (get("authors") or {}).get("authors") or ()
+        article.authors = tuple(a.get("full_name") for a in authors)
+        article.affiliations = tuple(_intern(a.get("affiliation")) for a in authors)
+        terms = ((get("index_terms") or {}).get("author_terms") or {}).get("terms")
+        article.keywords = tuple(_intern(t) for t in terms) if terms is not None else None
+        return article
+
+    def __eq__(self, other):
+        if not isinstance(other, Article):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Article(article_number=%r, title=%r)" % (self.article_number, self.title)
+
+
+def iter_articles(data):
+    """
+    Yield the articles of a page (the decoded json returned by the API) as Article.
+
+    Articles which already are Articles are passed through.
+    """
+    for article in data.get("articles") or ():
+        if not isinstance(article, Article):
+            article = Article.from_json(article)
+        yield article
@@ -0,0 +1,293 @@
+"""
+Common interface for the bibliographic databases.
+
+Every database (Google Scholar, IEEE Xplore, DBLP, ...) is wrapped in a
+`Backend` which knows how to search a single page and how to turn the raw
+results into records. Everything else -- keep-alive connections, rate
+limiting, concurrent paging, caching and removing duplicates -- is done
+here, once for all backends:
+
+    >>> backend = get_backend('dblp')
+    >>> for record in search_all(backend, ['5G AND security', 'security AND 5G']):
+    ...     print(record['title'])
+
+Records are dicts with the keys `source`, `id`, `title`, `authors` (a
+list), `year`, `doi`, `venue`, `url` and `raw` (the record as returned by
+the backend); missing values are None.
+
+New backends subclass `Backend` and are made available with `register`.
+"""
+
+import re
+import logging
+
+from querylib.canonical import unique_queries
+from querylib.tasks import bounded
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS = 4
+
+BACKENDS = {}
+
+# backends shipped with sbqt, imported on first use
+BUILTIN_BACKENDS = {
+    'scholar': 'gscholar.backend',
+    'ieee': 'ieeelib.backend',
+    'dblp': 'dblplib.backend',
+}
+
+
+class Page(object):
+    """One page of results.
+
+    Attributes
+    ----------
+    records : list of dict
+    total : int or None
+        total number of results of the query, None if the backend
+        doesn't tell
+
+    """
+    __slots__ = ('records', 'total')
+
+    def __init__(self, records, total=None):
+        self.records = records
+        self.total = total
+
+
+class Backend(object):
+    """Base class of all backends.
+
+    Subclasses set `name`, `label`, `page_size` and `rate` and implement
+    `fetch` and `parse`. Backends which know the citation graph implement
+    `citing` and/or `references` as well (see querylib.snowball).
+
+    """
+    # short name used in the registry
+    name = None
+    # name of the database, as in querylib.qc
+    label = None
+    # (maximal) number of records per page
+    page_size = 10
+    # requests per second
+    rate = None
+    # query syntax (see querylib.canonical), None if equivalent queries
+    # can't be recognized
+    syntax = None
+
+    def fetch(self, query, start, count, session):
+        """Return the raw result of one page of the query.
+
+        Parameters
+        ----------
+        query : str
+        start : int
+            index of the first record, starting with 0
+        count : int
+            number of records
+        session : querylib.http.Session
+
+        """
+        raise NotImplementedError
+
+    def parse(self, raw):
+        """Turn the raw result of `fetch` into a `Page`."""
+        raise NotImplementedError
+
+    def cache_key(self):
+        """Return what identifies the results of this backend in a cache.
+
+        Backends whose results depend on their options (fields searched,
+        years, ...) include those, so that pages of differently configured
+        instances don't share a cache entry.
+
+        """
+        return self.name
+
+    def search(self, query, start=0, count=None, session=None):
+        """Return one page of results as `Page`."""
+        if count is None:
+            count = self.page_size
+        return self.parse(self.fetch(query, start, count, session))
+
+    def citing(self, record, session=None):
+        """Return the records citing record (one page of them at most)."""
+        raise NotImplementedError("%s doesn't know who cites a paper" % self.name)
+
+    def references(self, record, session=None):
+        """Return the records cited by record."""
+        raise NotImplementedError("%s doesn't know the references of a paper" % self.name)
+
+    def session(self):
+        """Return a new session with the rate limit of this backend."""
+        from querylib.http import Session
+        return Session(rate=self.rate)
+
+
+def register(cls):
+    """Class decorator adding a backend to the registry."""
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def get_backend(name, **options):
+    """Return an instance of the backend registered as name.
+
+    Parameters
+    ----------
+    name : str
+        e.g. "scholar", "ieee" or "dblp"
+    options :
+        passed to the constructor of the backend (e.g. api_key)
+
+    """
+    if name not in BACKENDS and name in BUILTIN_BACKENDS:
+        __import__(BUILTIN_BACKENDS[name])
+    if name not in BACKENDS:
+        raise KeyError("Unknown backend: %s" % name)
+    return BACKENDS[name](**options)
+
+
+def backend_names():
+    """Return the names of all known backends."""
+    return sorted(set(BACKENDS) | set(BUILTIN_BACKENDS))
+
+
+_NON_ALNUM = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def record_key(record):
+    """Return the key under which duplicates of a record are found.
+
+    The DOI if there is one, the normalized title and year otherwise.
+
+    """
+    doi = record.get('doi')
+    if doi:
+        return 'doi:' + doi.strip().lower()
+    title = _NON_ALNUM.sub('', (record.get('title') or '').lower())
+    return 'title:%s:%s' % (title, record.get('year') or '')
+
+
+def make_record(source, id, title=None, authors=None, year=None, doi=None,
+                venue=None, url=None, raw=None):
+    """Return a record dict with all common keys."""
+    return {'source': source, 'id': id, 'title': title,
+            'authors': authors or [], 'year': year, 'doi': doi,
+            'venue': venue, 'url': url, 'raw': raw}
+
+
+def pages(backend, query, limit=None, jobs=DEFAULT_JOBS, session=None, cache=None):
+    """Yield the pages of a query in order.
+
+    If the backend reports the total number of results, all pages after
+    the first are fetched concurrently, otherwise page after page until
+    an empty one.
+
+    Parameters
+    ----------
+    backend : Backend
+    query : str
+    limit : int, optional
+        stop after this many records
+    jobs : int, optional
+        number of concurrent requests
+    session : querylib.http.Session, optional
+        by default a new one with the rate limit of the backend
+    cache : dict, optional
+        pages are looked up in and stored in this mapping, keyed by
+        `Backend.cache_key`, query, start and count
+
+    Yields
+    ------
+    Page
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    own_session = session is None
+    if own_session:
+        session = backend.session()
+    size = backend.page_size
+
+    def search(start):
+        count = size if limit is None else min(size, limit - start)
+        key = (backend.cache_key(), query, start, count)
+        if cache is not None and key in cache:
+            return cache[key]
+        page = backend.search(query, start, count, session)
+        if cache is not None:
+            cache[key] = page
+        return page
+
+    try:
+        first = search(0)
+        yield first
+        total = first.total
+        if total is None:
+            start = len(first.records)
+            while first.records and (limit is None or start < limit):
+                first = search(start)
+                yield first
+                start += len(first.records)
+            return
+        if limit is not None:
+            total = min(total, limit)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for _, future in bounded(executor, search, range(size, total, size), 2 * jobs):
+                yield future.result()
+    finally:
+        if own_session:
+            session.close()
+
+
+def search_all(backend, queries, limit=None, jobs=DEFAULT_JOBS, session=None, cache=None, seen=None):
+    """Yield the records of all queries, without duplicates.
+
+    Parameters
+    ----------
+    backend : Backend
+    queries : iterable of str
+        queries equivalent to an earlier one (see querylib.canonical) are
+        skipped
+    limit : int, optional
+        maximal number of records per query
+    jobs : int, optional
+        number of concurrent requests
+    session : querylib.http.Session, optional
+        shared by all queries, by default a new one with the rate limit of
+        the backend
+    cache : dict, optional
+        see `pages`
+    seen : set, optional
+        keys (see `record_key`) of records which are skipped, updated with
+        the keys of the returned records. Pass the same set to several
+        calls to remove duplicates across backends.
+
+    Yields
+    ------
+    dict
+        the records
+
+    """
+    own_session = session is None
+    if own_session:
+        session = backend.session()
+    if seen is None:
+        seen = set()
+    if backend.syntax is not None:
+        queries = unique_queries(queries, backend.syntax)
+    try:
+        for query in queries:
+            for page in pages(backend, query, limit, jobs, session, cache):
+                for record in page.records:
+                    key = record_key(record)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    yield record
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,254 @@
+"""
+Recognize equivalent queries and run each of them only once.
+
+Queries built from term bags often differ only in case, whitespace,
+quoting or the order of the terms, e.g. `5G AND security` and
+`Security AND  5g`. `canonical_query` maps all of them to the same key:
+
+    >>> canonical_query('"5G" AND Security', IEEE)
+    '5g AND security'
+    >>> canonical_query('security  AND 5g', IEEE)
+    '5g AND security'
+
+The operands of AND and OR are sorted and duplicates are dropped, nested
+groups of the same operator are flattened. Mixing AND and OR without
+parentheses depends on the precedence of the database: Google Scholar
+binds OR tighter than the implicit AND; for IEEE Xplore such sequences
+are kept in their order, as are the operands of its proximity operators
+NEAR/n and ONEAR/n.
+
+`unique_queries` drops the queries equivalent to an earlier one, and a
+`SingleFlight` makes sure concurrent equivalent requests are only sent
+once, all callers sharing the result.
+"""
+
+import re
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# query syntaxes
+SCHOLAR = 'scholar'
+IEEE = 'ieee'
+
+_AND = 'AND'
+_OR = 'OR'
+_NOT = 'NOT'
+# a sequence of operands and operators which can't be reordered
+_SEQ = 'SEQ'
+# IEEE Xplore's proximity operators, e.g. NEAR/3 or ONEAR/2
+_PROXIMITY_RE = re.compile(r'O?NEAR/\d+$')
+
+_QUOTES = {u'“': '"', u'”': '"', u'„': '"', u'«': '"', u'»': '"'}
+_QUOTES_RE = re.compile(u'[%s]' % ''.join(_QUOTES))
+# parentheses, quoted phrases (optionally with a field, "Abstract":5g or
+# author:"a b") and plain terms
+_TOKEN_RE = re.compile(r'\s*(\(|\)|"[^"]*"?(?::"[^"]*"?|:[^\s()"]+)?|[^\s()"]*:"[^"]*"?|[^\s()"]+)')
+_SPACE_RE = re.compile(r'\s+')
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def _tokenize(query):
+    query = _QUOTES_RE.sub(lambda m: _QUOTES[m.group()], query)
+    return [m.group(1) for m in _TOKEN_RE.finditer(query)]
+
+
+def _term(token, syntax):
+    """Normalize case, whitespace and quotes of a single term."""
+    token = _SPACE_RE.sub(' ', token.lower())
+    if token.count('"') % 2:
+        # unterminated phrase
+        token += '"'
+    token = _PHRASE_RE.sub(lambda m: '"%s"' % m.group(1).strip(), token)
+    if syntax == IEEE and ' ' not in token and _PHRASE_RE.match(token) and len(token) > 2 \
+            and token.count('"') == 2 and token.endswith('"'):
+        # quoting a single word makes no difference
+        token = token[1:-1]
+    return token
+
+
+class _Parser(object):
+
+    def __init__(self, tokens, syntax):
+        self.tokens = tokens
+        self.pos = 0
+        self.syntax = syntax
+
+    def parse(self):
+        node = self.sequence()
+        while self.pos < len(self.tokens):
+            # a stray closing parenthesis
+            self.pos += 1
+            node = (_AND, [node, self.sequence()])
+        return node
+
+    def sequence(self):
+        """Parse operands and operators up to the end of the group."""
+        operands = []
+        operators = []
+        while self.pos < len(self.tokens) and self.tokens[self.pos] != ')':
+            token = self.tokens[self.pos]
+            if (token in (_AND, _OR) or self.proximity(token)) and operands and len(operators) < len(operands):
+                operators.append(token)
+                self.pos += 1
+                continue
+            if token == _NOT and operands and len(operators) < len(operands):
+                # A NOT B is A AND NOT B
+                operators.append(_AND)
+            if len(operators) < len(operands):
+                # juxtaposition is AND
+                operators.append(_AND)
+            operands.append(self.unary())
+        operators = operators[:max(len(operands) - 1, 0)]
+        return self.combine(operands, operators)
+
+    def proximity(self, token):
+        return self.syntax == IEEE and _PROXIMITY_RE.match(token) is not None
+
+    def unary(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        if token == _NOT:
+            if self.pos >= len(self.tokens) or self.tokens[self.pos] == ')':
+                return ('TERM', 'not')
+            return (_NOT, self.unary())
+        if token == '(':
+            node = self.sequence()
+            # skip the closing parenthesis, if there is one
+            self.pos += 1
+            return node
+        if self.syntax == SCHOLAR and token.startswith('-') and len(token) > 1:
+            return (_NOT, ('TERM', _term(token[1:], self.syntax)))
+        return ('TERM', _term(token, self.syntax))
+
+    def combine(self, operands, operators):
+        if not operands:
+            return ('TERM', '')
+        if len(set(operators)) <= 1 and not any(self.proximity(o) for o in operators):
+            return (operators[0] if operators else _AND, operands)
+        if self.syntax == SCHOLAR:
+            # OR binds tighter than AND
+            groups = [[operands[0]]]
+            for operator, operand in zip(operators, operands[1:]):
+                if operator == _OR:
+                    groups[-1].append(operand)
+                else:
+                    groups.append([operand])
+            return (_AND, [(_OR, group) for group in groups])
+        items = [operands[0]]
+        for operator, operand in zip(operators, operands[1:]):
+            items.extend([operator, operand])
+        return (_SEQ, items)
+
+
+def _format(node, nested=False):
+    kind, value = node
+    if kind == 'TERM':
+        return value
+    if kind == _NOT:
+        return 'NOT ' + _format(value, True)
+    if kind == _SEQ:
+        text = ' '.join(item if isinstance(item, str) else _format(item, True) for item in value)
+        return '(%s)' % text if nested else text
+    # AND and OR: flatten nested groups of the same operator, sort, dedupe
+    operands = set()
+    stack = list(value)
+    while stack:
+        child = stack.pop()
+        if child[0] == kind:
+            stack.extend(child[1])
+        else:
+            operands.add(_format(child, True))
+    operands.discard('')
+    if len(operands) == 1:
+        return operands.pop()
+    text = (' %s ' % kind).join(sorted(operands))
+    return '(%s)' % text if nested else text
+
+
+def canonical_query(query, syntax=IEEE):
+    """Return the canonical form of a query.
+
+    Equivalent queries (differing in case, whitespace, quoting or the
+    order of AND/OR operands) have the same canonical form.
+
+    Parameters
+    ----------
+    query : str
+    syntax : str, optional
+        SCHOLAR or IEEE
+
+    Returns
+    -------
+    str
+
+    """
+    return _format(_Parser(_tokenize(query), syntax).parse())
+
+
+def unique_queries(queries, syntax=IEEE):
+    """Yield the queries which aren't equivalent to an earlier one."""
+    seen = set()
+    for query in queries:
+        key = canonical_query(query, syntax)
+        if key in seen:
+            logger.debug("Skipping duplicate query: {query}".format(query=query))
+            continue
+        seen.add(key)
+        yield query
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Run only one call per key at a time, sharing its result.
+
+    If `do` is called with the key of a call which is still running, it
+    waits for that call and returns its result (or raises its exception)
+    instead of running fn again.
+
+        >>> flight = SingleFlight()
+        >>> flight.do(canonical_query(q), query, q)
+
+    Finished calls are not remembered, use a cache for that.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # number of calls which shared the result of another one
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,241 @@
+"""
+Instrumentation hooks for the query libraries.
+
+Every phase of a query (sending the request, downloading the body, parsing
+the result, converting to bibtex, ...) is wrapped in a span:
+
+    >>> with span('ieeelib.query', query=search_str) as s:
+    ...     s.set('bytes', len(body))
+
+As long as no hook is registered, `span` returns a shared no-op object, so
+the instrumentation costs next to nothing. Register a hook to receive every
+finished span:
+
+    >>> metrics = Metrics()
+    >>> add_hook(metrics)
+    >>> gscholar.query('albert einstein')
+    >>> print(metrics.dump())
+
+Well known span attributes are `bytes` (number of bytes transferred),
+`status` (HTTP status code), `retries` (number of retries) and `records`
+(number of records handled).
+"""
+
+import time
+import threading
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry import context as otel_context
+except ImportError:
+    otel_trace = None
+    otel_context = None
+
+
+_start_hooks = []
+_end_hooks = []
+
+
+def add_hook(on_end, on_start=None):
+    """Register a hook.
+
+    Parameters
+    ----------
+    on_end : callable
+        called with the `Span` once it is finished
+    on_start : callable, optional
+        called with the `Span` when it is entered
+
+    """
+    if on_start is not None:
+        _start_hooks.append(on_start)
+    _end_hooks.append(on_end)
+
+
+def remove_hook(on_end, on_start=None):
+    """Unregister a hook previously registered with `add_hook`."""
+    if on_start is not None:
+        _start_hooks.remove(on_start)
+    _end_hooks.remove(on_end)
+
+
+class Span(object):
+    """A timed phase of a query.
+
+    Attributes
+    ----------
+    name : str
+    attributes : dict
+    start : float
+        wall clock time (seconds since the epoch) the span was entered
+    duration : float
+        duration in seconds, available once the span is finished
+    error : Exception or None
+        the exception which terminated the span, if any
+    context : dict
+        free storage for hooks (e.g. to keep a handle on a foreign span)
+
+    """
+    __slots__ = ('name', 'attributes', 'start', 'duration', 'error',
+                 'context', '_t0')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.duration = None
+        self.error = None
+        self.context = {}
+
+    def set(self, key, value):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        for hook in _start_hooks:
+            hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        self.error = exc
+        for hook in _end_hooks:
+            hook(self)
+        return False
+
+
+class _NullSpan(object):
+    """The span handed out while no hooks are registered."""
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, **attributes):
+    """Return a context manager timing the phase `name`.
+
+    Parameters
+    ----------
+    name : str
+        name of the phase, e.g. "gscholar.query" or "http.read"
+    attributes :
+        initial attributes of the span
+
+    Returns
+    -------
+    Span
+        or a no-op stand-in if no hooks are registered
+
+    """
+    if not _end_hooks:
+        return NULL_SPAN
+    return Span(name, attributes)
+
+
+def enabled():
+    """Return True if at least one hook is registered."""
+    return bool(_end_hooks)
+
+
+class Metrics(object):
+    """Hook aggregating spans into Prometheus style metrics.
+
+    Register an instance with `add_hook` and call `dump` to get the metrics
+    in the Prometheus text exposition format.
+
+    """
+
+    def __init__(self, prefix='sbqt'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._count = {}
+        self._seconds = {}
+        self._bytes = {}
+        self._retries = {}
+        self._errors = {}
+        self._status = {}
+
+    def __call__(self, span):
+        name = span.name
+        attributes = span.attributes
+        with self._lock:
+            self._count[name] = self._count.get(name, 0) + 1
+            self._seconds[name] = self._seconds.get(name, 0.0) + span.duration
+            if 'bytes' in attributes:
+                self._bytes[name] = self._bytes.get(name, 0) + attributes['bytes']
+            if 'retries' in attributes:
+                self._retries[name] = self._retries.get(name, 0) + attributes['retries']
+            if span.error is not None:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            if 'status' in attributes:
+                key = (name, attributes['status'])
+                self._status[key] = self._status.get(key, 0) + 1
+
+    def dump(self):
+        """Return the collected metrics as Prometheus text."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines.append('# TYPE %s_span_seconds summary' % p)
+            for name in sorted(self._count):
+                lines.append('%s_span_seconds_count{span="%s"} %d' % (p, name, self._count[name]))
+                lines.append('%s_span_seconds_sum{span="%s"} %.6f' % (p, name, self._seconds[name]))
+            for metric, values in (('bytes', self._bytes),
+                                   ('retries', self._retries),
+                                   ('errors', self._errors)):
+                lines.append('# TYPE %s_span_%s_total counter' % (p, metric))
+                for name in sorted(values):
+                    lines.append('%s_span_%s_total{span="%s"} %d' % (p, metric, name, values[name]))
+            lines.append('# TYPE %s_http_responses_total counter' % p)
+            for (name, status) in sorted(self._status):
+                lines.append('%s_http_responses_total{span="%s",code="%s"} %d'
+                             % (p, name, status, self._status[(name, status)]))
+        return '\n'.join(lines) + '\n'
+
+
+class OpenTelemetryHook(object):
+    """Mirror spans into OpenTelemetry.
+
+    Requires the `opentelemetry-api` package. Register with:
+
+        >>> otel = OpenTelemetryHook()
+        >>> add_hook(otel.on_end, otel.on_start)
+
+    """
+
+    def __init__(self, tracer=None):
+        if otel_trace is None:
+            raise RuntimeError("OpenTelemetryHook requires the opentelemetry-api package.")
+        if tracer is None:
+            tracer = otel_trace.get_tracer('sbqt')
+        self.tracer = tracer
+
+    def on_start(self, span):
+        ospan = self.tracer.start_span(span.name, start_time=int(span.start * 1e9))
+        span.context['otel_span'] = ospan
+        span.context['otel_token'] = otel_context.attach(otel_trace.set_span_in_context(ospan))
+
+    def on_end(self, span):
+        ospan = span.context.pop('otel_span', None)
+        if ospan is None:
+            return
+        otel_context.detach(span.context.pop('otel_token'))
+        for key, value in span.attributes.items():
+            if isinstance(value, (bool, int, float, str)):
+                ospan.set_attribute(key, value)
+        if span.error is not None:
+            ospan.record_exception(span.error)
+            ospan.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        ospan.end(end_time=int((span.start + span.duration) * 1e9))
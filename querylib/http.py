@@ -0,0 +1,472 @@
+"""
+A small HTTP session with keep-alive connections and rate limiting.
+
+Unlike `urlopen`, which opens (and TLS handshakes) a new connection for
+every request, a `Session` keeps its connections open and reuses them. A
+session can be shared between threads; its `RateLimiter` spaces out the
+requests of all threads.
+
+    >>> session = Session(rate=1)
+    >>> response = session.request("https://scholar.google.com/scholar?q=x")
+    >>> with read_body(response) as body:
+    ...     html = body.text()
+
+`read_body` reads a response into a single buffer of the announced size
+(or into a temporary, memory-mapped file if it is large) instead of
+joining the chunks `read()` collects, and refuses bodies over a maximal
+size. The callers decode the whole body with `Body.text` to parse it, so
+a request in flight still takes up to the decoded size of MAX_BODY_SIZE
+bytes (1 to 4 times that, depending on the characters); spooling only
+saves the copy of the raw bytes.
+
+`fetch` sends a request, reads and decodes the body in one call and times
+the phases in spans (see querylib.hooks).
+
+The `http.client` and `ssl` modules are only imported once the first
+request is made.
+"""
+
+import time
+import threading
+
+try:
+    from urllib.parse import urlsplit, urljoin
+except ImportError:
+    from urlparse import urlsplit, urljoin
+
+from querylib.hooks import span
+
+
+MAX_REDIRECTS = 5
+DEFAULT_TIMEOUT = 30
+# bodies larger than this are refused, far more than a page of results
+MAX_BODY_SIZE = 16 * 2**20
+# bodies larger than this are kept in a temporary file instead of in memory
+SPOOL_SIZE = 2**20
+# size of the buffer bodies of unknown length are read with
+CHUNK_SIZE = 2**16
+# redirect and error bodies up to this size are read to reuse the
+# connection, the connection of larger ones is closed
+DRAIN_SIZE = 2**16
+
+
+class RateLimiter(object):
+    """Limit the number of requests per second over all threads.
+
+    Parameters
+    ----------
+    rate : float or None
+        requests per second, None means no limit
+
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """Block until the next request may be sent."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PooledResponse(object):
+    """A response whose connection goes back to the pool once it is read.
+
+    Behaves like the response returned by `urlopen` (`status`, `getcode`,
+    `getheader`, `read`, `readinto`, ...).
+
+    """
+
+    def __init__(self, session, key, connection, response, url, retries=0):
+        self._session = session
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.url = url
+        # requests repeated on a new connection because the idle one was closed
+        self.retries = retries
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def _check_done(self):
+        if self._connection is not None and self._response.isclosed():
+            self._session._release(self._key, self._connection)
+            self._connection = None
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        self._check_done()
+        return data
+
+    def readinto(self, b):
+        n = self._response.readinto(b)
+        self._check_done()
+        return n
+
+    def close(self):
+        """Close the response; an unread connection is discarded."""
+        self._check_done()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BodyTooLarge(IOError):
+    """Raised by `read_body` if a body is larger than allowed."""
+
+
+class Body(object):
+    """The body of a response, as returned by `read_body`.
+
+    Attributes
+    ----------
+    view : memoryview
+        the content, without a copy. Only valid until the body is closed.
+
+    """
+    __slots__ = ('view', '_buffer', '_file')
+
+    def __init__(self, view, buffer, file=None):
+        self.view = view
+        # keeps the bytearray or mmap of the view
+        self._buffer = buffer
+        self._file = file
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def spooled(self):
+        """True if the body is kept in a temporary file."""
+        return self._file is not None
+
+    def text(self, encoding='utf8', errors='strict'):
+        """Return the content decoded, without an intermediate bytes copy."""
+        return str(self.view, encoding, errors)
+
+    def tobytes(self):
+        return self.view.tobytes()
+
+    def close(self):
+        """Release the buffer (and delete the temporary file)."""
+        self.view.release()
+        if self._file is not None:
+            self._buffer.close()
+            self._file.close()
+        self._buffer = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_local = threading.local()
+
+
+def _chunk_buffer():
+    """Return the read buffer of the current thread, reused for all bodies."""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = memoryview(bytearray(CHUNK_SIZE))
+    return buffer
+
+
+def read_body(response, max_size=MAX_BODY_SIZE, spool_size=SPOOL_SIZE):
+    """Read the whole body of a response.
+
+    If the response announces its length, the body is read with `readinto`
+    straight into a buffer of that size, otherwise in chunks through a
+    reused per-thread buffer. Bodies larger than spool_size are written to
+    a temporary file which is then memory-mapped, so they don't take
+    (unswappable) memory.
+
+    Parameters
+    ----------
+    response : PooledResponse or http.client.HTTPResponse
+        e.g. as returned by `Session.request` or `urlopen`
+    max_size : int, optional
+        maximal size of the body in bytes, None for no limit
+    spool_size : int, optional
+        bodies up to this size are kept in memory
+
+    Returns
+    -------
+    Body
+
+    Raises
+    ------
+    BodyTooLarge
+        if the body is larger than max_size. The response is closed.
+
+    """
+    length = response.getheader('Content-Length')
+    try:
+        length = int(length) if length is not None else None
+    except ValueError:
+        length = None
+    try:
+        if length is not None and max_size is not None and length > max_size:
+            raise BodyTooLarge("Body of %d bytes exceeds the maximum of %d bytes" % (length, max_size))
+        if length is not None and length <= spool_size:
+            buffer = bytearray(length)
+            view = memoryview(buffer)
+            pos = 0
+            if not length:
+                # mark the response as done, which releases a pooled connection
+                response.read()
+            while pos < length:
+                n = response.readinto(view[pos:])
+                if not n:
+                    break
+                pos += n
+            return Body(view[:pos] if pos < length else view, buffer)
+        return _spool(response, max_size, spool_size)
+    except BaseException:
+        response.close()
+        raise
+
+
+def _spool(response, max_size, spool_size):
+    """Read a body of unknown or large size, see `read_body`."""
+    import mmap
+    import tempfile
+
+    chunk = _chunk_buffer()
+    data = bytearray()
+    file = None
+    size = 0
+    while True:
+        n = response.readinto(chunk)
+        if not n:
+            break
+        size += n
+        if max_size is not None and size > max_size:
+            if file is not None:
+                file.close()
+            raise BodyTooLarge("Body exceeds the maximum of %d bytes" % max_size)
+        if file is None and size > spool_size:
+            file = tempfile.TemporaryFile()
+            file.write(data)
+            data = None
+        if file is not None:
+            file.write(chunk[:n])
+        else:
+            data += chunk[:n]
+    if file is None:
+        return Body(memoryview(data), data)
+    file.flush()
+    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return Body(memoryview(mapped), mapped, file)
+
+
+class Session(object):
+    """Keep-alive HTTP(S) connections, shared between threads.
+
+    Parameters
+    ----------
+    rate : float, optional
+        maximal number of requests per second
+    timeout : float, optional
+        socket timeout in seconds
+    headers : dict, optional
+        headers sent with every request
+
+    """
+
+    def __init__(self, rate=None, timeout=DEFAULT_TIMEOUT, headers=None):
+        self.limiter = RateLimiter(rate)
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def _connect(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._open(key), False
+
+    def _open(self, key):
+        """Open a new connection, timing name resolution, TCP and TLS handshakes."""
+        import http.client
+        scheme, host = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(host, timeout=self.timeout)
+        try:
+            with span('http.connect', host=host):
+                connection.connect()
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def _release(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def request(self, url, headers=None):
+        """Send a GET request and return the response.
+
+        Redirects are followed. Responses with a status >= 400 raise
+        `urllib.error.HTTPError`, just like `urlopen`.
+
+        Parameters
+        ----------
+        url : str
+        headers : dict, optional
+
+        Returns
+        -------
+        PooledResponse
+
+        """
+        import http.client
+        from urllib.error import HTTPError
+
+        allheaders = dict(self.headers)
+        allheaders.update(headers or {})
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            self.limiter.wait()
+            connection, reused = self._connect(key)
+            retries = 0
+            try:
+                connection.request('GET', path, headers=allheaders)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused:
+                    raise
+                # the server closed the idle connection, retry on a new one
+                # (not on another idle one, which may be just as stale)
+                retries += 1
+                connection = self._open(key)
+                try:
+                    connection.request('GET', path, headers=allheaders)
+                    response = connection.getresponse()
+                except BaseException:
+                    connection.close()
+                    raise
+            pooled = PooledResponse(self, key, connection, response, url, retries)
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader('Location')
+                self._discard(pooled)
+                url = urljoin(url, location)
+                continue
+            if response.status >= 400:
+                self._discard(pooled)
+                raise HTTPError(url, response.status, response.reason,
+                                response.msg, None)
+            return pooled
+        raise HTTPError(url, response.status, "Too many redirects",
+                        response.msg, None)
+
+    def _discard(self, pooled):
+        """Drop the body of a redirect or error, reading it only if it is small."""
+        try:
+            read_body(pooled, DRAIN_SIZE, DRAIN_SIZE).close()
+        except BodyTooLarge:
+            # read_body closed the response, which discards the connection
+            pass
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def fetch(url, headers=None, session=None, span_url=None, max_size=MAX_BODY_SIZE):
+    """Fetch url and return the body, decoded as utf8.
+
+    The request is timed in the span "http.request", which records the
+    status (of error responses as well) and, with a session, the number of
+    retries; reading the body in "http.read", which records its size. With
+    a session new connections are set up in "http.connect" first, so
+    "http.request" only measures the latency of the server up to the
+    response headers; without one, `urlopen` connects within
+    "http.request".
+
+    Parameters
+    ----------
+    url : str
+    headers : dict, optional
+    session : Session, optional
+        by default a new connection is opened with `urlopen`
+    span_url : str, optional
+        the url recorded in the spans, e.g. without a query string holding
+        an API key. By default url.
+    max_size : int, optional
+        see `read_body`
+
+    Returns
+    -------
+    str
+
+    Raises
+    ------
+    urllib.error.HTTPError
+        if the response has an error status
+    BodyTooLarge
+        if the body is larger than max_size
+
+    """
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+
+    if span_url is None:
+        span_url = url
+    with span('http.request', url=span_url) as s:
+        try:
+            if session is not None:
+                response = session.request(url, headers)
+                s.set('retries', response.retries)
+            else:
+                response = urlopen(Request(url, headers=headers or {}))
+        except HTTPError as e:
+            s.set('status', e.code)
+            raise
+        s.set('status', response.getcode())
+    with span('http.read', url=span_url) as s:
+        with read_body(response, max_size) as body:
+            s.set('bytes', len(body))
+            return body.text('utf8')
@@ -0,0 +1,255 @@
+"""
+Citation-graph snowballing: starting from seed papers, follow the papers
+citing them (forward) and/or the papers they cite (backward), level by
+level, up to a given depth.
+
+    >>> backend = get_backend('scholar')
+    >>> seeds = list(search_all(backend, ['snowballing literature review'], limit=5))
+    >>> graph = snowball(backend, seeds, 'review.graph', depth=2, budget=500)
+    >>> for record in graph.records():
+    ...     print(record['title'])
+
+The graph (the papers with their depth, and the citation edges) is kept in
+an sqlite database instead of in memory, which also serves as the visited
+set: a paper is keyed by its DOI, Scholar cluster id or title and year
+(see `node_key`), so it is expanded only once however often it is found.
+An interrupted run (or one that ran out of budget) is resumed by calling
+`snowball` again with the same database, it continues with the papers not
+expanded yet.
+
+Only the requests run concurrently; all database writes happen in the
+calling thread.
+
+Which directions are available depends on the backend: Google Scholar
+knows who cites a paper, but not the references of a paper; IEEE Xplore
+and DBLP don't expose citations in their public APIs.
+"""
+
+import json
+import logging
+import sqlite3
+import itertools
+
+from querylib.backends import DEFAULT_JOBS, record_key
+from querylib.hooks import span
+from querylib.tasks import bounded
+
+
+logger = logging.getLogger(__name__)
+
+FORWARD = 'forward'
+BACKWARD = 'backward'
+BOTH = 'both'
+
+# number of frontier rows read from the database at a time
+FRONTIER_BATCH = 1000
+
+# edge kinds, an edge always points from the citing to the cited paper
+CITES = 'cites'
+
+
+def node_key(record):
+    """Return the key identifying a paper in the graph.
+
+    The DOI if there is one, the Scholar cluster id otherwise, and the
+    normalized title and year as a last resort.
+
+    """
+    if not record.get('doi') and record.get('cluster'):
+        return 'cluster:%s' % record['cluster']
+    return record_key(record)
+
+
+class Graph(object):
+    """A citation graph stored in an sqlite database.
+
+    Parameters
+    ----------
+    path : str
+        the database file, created if it doesn't exist. ":memory:" keeps
+        the graph in memory.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                key TEXT PRIMARY KEY,
+                depth INTEGER NOT NULL,
+                expanded INTEGER NOT NULL DEFAULT 0,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS nodes_frontier ON nodes (expanded, depth);
+            CREATE TABLE IF NOT EXISTS edges (
+                src TEXT NOT NULL,
+                dst TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                PRIMARY KEY (src, dst, kind)
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM nodes").fetchone()[0]
+
+    def add(self, record, depth):
+        """Add a paper, return its key and whether it is new."""
+        key = node_key(record)
+        # the raw record can be large and isn't needed to follow citations
+        record = dict((k, v) for k, v in record.items() if k != 'raw')
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO nodes (key, depth, record) VALUES (?, ?, ?)",
+            (key, depth, json.dumps(record)))
+        return key, cursor.rowcount > 0
+
+    def add_edge(self, src, dst, kind=CITES):
+        self.db.execute("INSERT OR IGNORE INTO edges VALUES (?, ?, ?)", (src, dst, kind))
+
+    def mark_expanded(self, key):
+        self.db.execute("UPDATE nodes SET expanded = 1 WHERE key = ?", (key,))
+
+    def commit(self):
+        self.db.commit()
+
+    def frontier(self, max_depth, skip=()):
+        """Yield (key, depth, record) of the papers to expand next.
+
+        These are the unexpanded papers (except those in skip) of the
+        lowest depth below max_depth. They are read from the database in
+        batches, so the frontier is never held in memory as a whole.
+
+        """
+        depths = [d for (d,) in self.db.execute(
+            "SELECT DISTINCT depth FROM nodes WHERE expanded = 0 AND depth < ? ORDER BY depth",
+            (max_depth,))]
+        for depth in depths:
+            found = False
+            last = ''
+            while True:
+                rows = self.db.execute(
+                    "SELECT key, record FROM nodes WHERE expanded = 0 AND depth = ? AND key > ? "
+                    "ORDER BY key LIMIT ?", (depth, last, FRONTIER_BATCH)).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                for key, record in rows:
+                    if key not in skip:
+                        found = True
+                        yield key, depth, json.loads(record)
+            if found:
+                return
+
+    def records(self):
+        """Yield the records of all papers, ordered by depth."""
+        for (record,) in self.db.execute("SELECT record FROM nodes ORDER BY depth, rowid"):
+            yield json.loads(record)
+
+    def edges(self):
+        """Yield (src, dst, kind) of all edges."""
+        for edge in self.db.execute("SELECT src, dst, kind FROM edges"):
+            yield edge
+
+
+def _expand(backend, record, direction, session):
+    """Return the citing and the cited records of record."""
+    citing = cited = []
+    with span('snowball.expand', backend=backend.name) as s:
+        if direction in (FORWARD, BOTH):
+            citing = backend.citing(record, session)
+        if direction in (BACKWARD, BOTH):
+            cited = backend.references(record, session)
+        s.set('records', len(citing) + len(cited))
+    return citing, cited
+
+
+def snowball(backend, seeds, path, depth=1, direction=FORWARD, jobs=DEFAULT_JOBS,
+             budget=None, session=None):
+    """Follow the citations of the seed papers and return the graph.
+
+    Parameters
+    ----------
+    backend : querylib.backends.Backend
+        a backend implementing `citing` (forward) and/or `references`
+        (backward)
+    seeds : iterable of dict
+        the records to start from, e.g. from `search_all`. Seeds already in
+        the graph are skipped.
+    path : str
+        the sqlite database the graph is stored in. Runs with the same
+        database continue where the last one stopped.
+    depth : int, optional
+        how many citation steps to go from the seeds
+    direction : str, optional
+        FORWARD (papers citing the seeds), BACKWARD (papers cited by the
+        seeds) or BOTH
+    jobs : int, optional
+        number of papers expanded concurrently
+    budget : int, optional
+        maximal number of papers to expand in this run. The papers left are
+        expanded by the next run.
+    session : querylib.http.Session, optional
+        by default a new one with the rate limit of the backend
+
+    Returns
+    -------
+    Graph
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if direction not in (FORWARD, BACKWARD, BOTH):
+        raise ValueError("Unknown direction: %s" % direction)
+    own_session = session is None
+    if own_session:
+        session = backend.session()
+    graph = Graph(path)
+    for record in seeds:
+        graph.add(record, 0)
+    graph.commit()
+
+    def expand(node):
+        return _expand(backend, node[2], direction, session)
+
+    expanded = 0
+    # papers which failed in this run, retried by the next one
+    failed = set()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # one level per iteration, so every paper is found at its
+            # lowest depth
+            while budget is None or expanded < budget:
+                level = graph.frontier(depth, failed)
+                if budget is not None:
+                    level = itertools.islice(level, budget - expanded)
+                submitted = 0
+                for (key, level_depth, _), future in bounded(executor, expand, level, 2 * jobs, ordered=False):
+                    submitted += 1
+                    try:
+                        citing, cited = future.result()
+                    except NotImplementedError:
+                        raise
+                    except Exception:
+                        logger.warning("Expanding {key} failed".format(key=key), exc_info=True)
+                        failed.add(key)
+                        continue
+                    for other in citing:
+                        other_key, _ = graph.add(other, level_depth + 1)
+                        graph.add_edge(other_key, key)
+                    for other in cited:
+                        other_key, _ = graph.add(other, level_depth + 1)
+                        graph.add_edge(key, other_key)
+                    graph.mark_expanded(key)
+                    graph.commit()
+                expanded += submitted
+                if not submitted:
+                    # nothing left to expand
+                    break
+    finally:
+        if own_session:
+            session.close()
+    logger.debug("Expanded {n} papers, the graph has {size}".format(n=expanded, size=len(graph)))
+    return graph
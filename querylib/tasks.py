@@ -0,0 +1,61 @@
+"""
+Run calls in an executor with a bounded number of them in flight.
+
+Paging, batch lookups, snowballing and the BibTeX conversion all feed a
+possibly long stream of work items into a thread or process pool. Submitting
+them all at once would hold every item and every result in memory, so
+`bounded` only keeps a fixed number of calls pending and submits the next
+item whenever one finishes:
+
+    >>> with ThreadPoolExecutor(max_workers=4) as executor:
+    ...     for start, future in bounded(executor, fetch, starts, 8):
+    ...         page = future.result()
+"""
+
+import itertools
+from collections import OrderedDict
+
+
+def bounded(executor, fn, items, limit, ordered=True):
+    """Run fn(item) for all items, at most limit at a time.
+
+    The items are only consumed as calls finish, so they can be a lazy
+    (or very long) iterator.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+    fn : callable
+        called with one item, must be picklable for a ProcessPoolExecutor
+    items : iterable
+    limit : int
+        maximal number of calls submitted and not yet yielded
+    ordered : bool, optional
+        yield the calls in the order of the items instead of as soon as
+        they are done
+
+    Yields
+    ------
+    (item, concurrent.futures.Future)
+        the finished calls; `future.result()` returns the result of fn or
+        raises its exception
+
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+
+    items = iter(items)
+    # future -> item, in the order of submission
+    pending = OrderedDict()
+    for item in itertools.islice(items, limit):
+        pending[executor.submit(fn, item)] = item
+    while pending:
+        if ordered:
+            done = [next(iter(pending))]
+            wait(done)
+        else:
+            done = wait(list(pending), return_when=FIRST_COMPLETED)[0]
+        for future in done:
+            item = pending.pop(future)
+            for next_item in itertools.islice(items, 1):
+                pending[executor.submit(fn, next_item)] = next_item
+            yield item, future
@@ -7,15 +7,19 @@ It is being developed to be used in a systematic mapping study / systematic lite
 """
 
 import os
-import json
+import sys
 import bibtexparser
 from urllib.request import quote
 
 import ieeelib
 import ieeelib.ieeeresultparser as ieeeparser
+from ieeelib.delta import DeltaState, query_new
+from ieeelib.keypool import KeyPool
+from ieeelib.record import Article
 import querylib
+from querylib.hooks import span
+from querylib.canonical import unique_queries, IEEE as IEEE_SYNTAX
 
-from utils import dotdict
 from sbqt_errors import *
 
 results_dir = "query_results"
@@ -53,47 +57,99 @@ def load_api_key(filename):
     return api_key
 
 
-def ieee_query():
+def load_api_keys(prefix):
+    """
+    Read all api keys in files named <prefix>*.key (e.g., ieee.key, ieee-2.key) and return them as a list.
+    """
+    keys = []
+    for filename in sorted(os.listdir(api_dir)):
+        if filename.startswith(prefix) and filename.endswith(".key"):
+            keys.append(load_api_key(filename))
+    return keys
+
+
+def ieee_query(incremental=False):
     """
     Run queries on the IEEE Xplore DB using their REST API. Requires a valid API key. 
+
+    With incremental=True only records which are new (or changed) since the last
+    incremental run of the same query are fetched and appended to the bibtex file.
     """
-    api_key = load_api_key("ieee.key")
+    # all IEEE keys are used, counting their calls across runs
+    api_key = KeyPool(load_api_keys("ieee"), os.path.join(api_dir, "ieee.usage.json"), wait_for_reset=True)
 
     queries = construct_queries()
 
     fields_mask = ieeelib.SEARCH_FIELD_ABSTRACT | ieeelib.SEARCH_FIELD_DOC_TITLE
 
-    for query in queries:
-        query_result = ieeelib.query(query, api_key, max_records=max_records, fields_mask=fields_mask)
-        #save_json(query_result, fields_mask)
-        ieee_data = json.loads(query_result)
+    # queries differing only in case, quoting or term order are sent once
+    for query in unique_queries(queries, IEEE_SYNTAX):
+        if incremental:
+            ieee_query_incremental(query, api_key, fields_mask)
+            continue
+
+        pages = ieeelib.query_pages(query, api_key, max_records=max_records, fields_mask=fields_mask)
+
+        # every page is written as soon as it is converted, so only one page
+        # is held in memory
+        with open(bibtex_path(query, fields_mask), "a") as bibfile:
+            for page_nr, ieee_data in enumerate(pages):
+                if not ieee_data:
+                    print("Something went wrong while retrieving page %d for query %s. Aborting." % (page_nr, query), file=sys.stderr)
+                    exit(NO_DATA_ERROR)
+                if not ieee_data.get("articles"):
+                    continue
+
+                bibtex_db = ieeeparser.bibtexize(ieee_data)
+                with span('sbqt.bibtex_dump', records=len(bibtex_db.entries)):
+                    bibtexparser.dump(bibtex_db, bibfile)
+    print ('ieee_query() for query "%s" finished.' % query)
 
-        if not ieee_data:
-            print("No data returned for query %s. Aborting." % query, file=sys.stderr)
-            exit(NO_DATA_ERROR)
-            
-        ieee_data = dotdict(ieee_data)
-        bibtex_str = bibtexparser.dumps(ieeeparser.bibtexize(ieee_data))
-        #write_bibtex(ieee_data, query, fields_mask)
-            
-        total_records = ieee_data.total_records
-        next_start_record = 1 + max_records
-        
-        while next_start_record < total_records:
-            #print("DEBUG: Retrieving records starting at %s..." % next_start_record)
-            next_start_record = next_start_record + max_records
-            query_result = ieeelib.query(query, api_key, max_records=max_records, fields_mask=fields_mask)
-            ieee_data = json.loads(query_result)
-            if not ieee_data:
-                print("Something went wrong while retrieving records starting at %s for query. Aborting." % (next_start_record, query), file=sys.stderr)
-                exit(NO_DATA_ERROR)
-            
-            ieee_data = dotdict(ieee_data)
-            bibtex_str = bibtex_str + bibtexparser.dumps(ieeeparser.bibtexize(ieee_data))
-            #write_bibtex(ieee_data, query, fields_mask)
 
-        write_bibtex_str(bibtex_str, query, fields_mask)
-    print ('ieee_query() for query "%s" finished.' % query)
+
+def ieee_query_incremental(query, api_key, mask):
+    """
+    Fetch the records of the given query which are new or changed since the last run and add them to its bibtex
+    file. New records are appended, changed records replace their old entry.
+    """
+    state_filename = "%s-mask=%d.state.json" % (query, mask)
+    state = DeltaState(os.path.join(results_dir, state_filename))
+    known = set(state.seen)
+
+    articles = [Article.from_json(a) for a in query_new(query, state, api_key, max_records=max_records, fields_mask=mask)]
+    changed = [a for a in articles if str(a.article_number) in known]
+    if changed:
+        replace_bibtex_entries(ieeeparser.bibtexize({"articles": articles}), query, mask)
+    elif articles:
+        bibtex_db = ieeeparser.bibtexize({"articles": articles})
+        write_bibtex_str(bibtexparser.dumps(bibtex_db), query, mask)
+    state.save()
+    print('%d new and %d changed records for query "%s".' % (len(articles) - len(changed), len(changed), query))
+
+
+def replace_bibtex_entries(bibtex_db, query, mask):
+    """
+    Add the entries of bibtex_db to the bibtex file of the given query, replacing the entries with the same ID.
+    """
+    path = bibtex_path(query, mask)
+    entries = []
+    if os.path.exists(path):
+        parser = bibtexparser.bparser.BibTexParser(common_strings=False)
+        # keep the entry types bibtexize writes (e.g. inproceeding)
+        parser.ignore_nonstandard_types = False
+        with open(path, "r") as f:
+            entries = bibtexparser.load(f, parser=parser).entries
+    updates = dict((entry["ID"], entry) for entry in bibtex_db.entries)
+    entries = [updates.pop(entry["ID"], entry) for entry in entries]
+    entries.extend(entry for entry in bibtex_db.entries if entry["ID"] in updates)
+
+    db = bibtexparser.bibdatabase.BibDatabase()
+    db.entries = entries
+    # write a copy first, so an interrupted run keeps the old file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        bibtexparser.dump(db, f)
+    os.replace(tmp, path)
 
             
 def write_bibtex(data, query, mask):
@@ -106,18 +162,27 @@ def write_bibtex(data, query, mask):
             
     ieeeparser.append_to_bibfile(bibtex_db, bibtex_full_path)
     
-def write_bibtex_str(bibtex_str, query, mask):
+def bibtex_path(query, mask):
     """
+    Return the path of the bibtex file of the given query.
     """
     bibtex_filename =  "%s-mask=%d.bib" % (query, mask)
-    bibtex_full_path = os.path.join(results_dir, bibtex_filename)
+    return os.path.join(results_dir, bibtex_filename)
+
 
-    with open(bibtex_full_path, "a") as f:
+def write_bibtex_str(bibtex_str, query, mask):
+    """
+    """
+    with open(bibtex_path(query, mask), "a") as f:
         f.write(bibtex_str)
     
 
 def __main__():
-    ieee_query()
+    try:
+        ieee_query(incremental="--incremental" in sys.argv[1:])
+    except UnknownContentType as e:
+        print("%s Aborting." % e, file=sys.stderr)
+        exit(UNKNOWN_ARTICLE_TYPE_ERROR)
     
 if __name__ == "__main__":
     __main__()
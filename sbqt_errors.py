@@ -1,2 +1,8 @@
 NO_DATA_ERROR = 1
 UNKNOWN_ARTICLE_TYPE_ERROR = 2
+
+
+class UnknownContentType(ValueError):
+    """
+    Raised for an IEEE article of a content type which can't be converted to bibtex.
+    """
@@ -19,7 +19,7 @@ setup(name='gscholar',
       author='Bastian Venthur',
       author_email='mail@venthur.de',
       url='https://github.com/venthur/gscholar',
-      packages=['gscholar'],
+      packages=['gscholar', 'querylib'],
       entry_points={
           'console_scripts': [
               'gscholar = gscholar.__main__:main'
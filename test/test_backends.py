@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import json
+import threading
+import unittest
+from unittest import mock
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from querylib import backends
+from dblplib import dblplib as dblp
+
+TOTAL_HITS = 25
+
+
+def hit(n):
+    info = {"key": "journals/x/%d" % n, "title": "Paper %d." % n, "year": "2019",
+            "venue": "IEEE Access", "authors": {"author": {"text": "Author %d" % n}}}
+    if n % 2:
+        info["doi"] = "10.1109/ACCESS.2019.%d" % n
+    return {"info": info}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Stand-in for the DBLP search API with TOTAL_HITS hits per query."""
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        first = int(params['f'][0])
+        count = int(params['h'][0])
+        hits = [hit(n) for n in range(first, min(first + count, TOTAL_HITS))]
+        body = json.dumps({"result": {"hits": {
+            "@total": str(TOTAL_HITS), "@first": str(first), "@sent": str(len(hits)),
+            "hit": hits}}}).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:%d/search/publ/api' % cls.server.server_port
+        cls.patch = mock.patch.object(dblp, 'DBLP_URL', url)
+        cls.patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patch.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.backend = backends.get_backend('dblp')
+        self.backend.page_size = 10
+        self.backend.rate = None
+
+    def test_registry(self):
+        self.assertIn('dblp', backends.backend_names())
+        self.assertIn('ieee', backends.backend_names())
+        with self.assertRaises(KeyError):
+            backends.get_backend('nonexistent')
+
+    def test_pages(self):
+        """All pages are returned in order, parsed into records."""
+        records = [r for page in backends.pages(self.backend, 'x') for r in page.records]
+        self.assertEqual([r['id'] for r in records],
+                         ['journals/x/%d' % n for n in range(TOTAL_HITS)])
+        self.assertEqual(records[1]['authors'], ['Author 1'])
+        self.assertEqual(records[1]['doi'], '10.1109/ACCESS.2019.1')
+
+    def test_search_all(self):
+        """Duplicates within and across queries are removed, pages cached."""
+        cache = {}
+        records = list(backends.search_all(self.backend, ['a', 'b'], limit=15, cache=cache))
+        self.assertEqual(len(records), 15)
+        self.assertEqual(len(cache), 4)
+        list(backends.search_all(self.backend, ['a'], limit=15, cache=cache))
+        self.assertEqual(len(cache), 4)
+
+    def test_cache_key(self):
+        """Pages of differently configured backends aren't shared."""
+        cache = {}
+        ieee = backends.get_backend('ieee', api_key='key')
+        other = backends.get_backend('ieee', api_key='key', start_year=2020)
+        self.assertNotEqual(ieee.cache_key(), other.cache_key())
+        page = backends.Page([])
+        with mock.patch.object(type(ieee), 'search', return_value=page) as search:
+            list(backends.pages(ieee, 'x', session=object(), cache=cache))
+            list(backends.pages(other, 'x', session=object(), cache=cache))
+            list(backends.pages(ieee, 'x', session=object(), cache=cache))
+        self.assertEqual(search.call_count, 2)
+        self.assertEqual(len(cache), 2)
+
+    def test_scholar_count(self):
+        """Only the bibtex links of the records asked for are followed."""
+        from gscholar import gscholar as gs
+        urls = []
+
+        def fetch(url, header, session=None, span_url=None):
+            urls.append(url)
+            return '@article{a%d, title={Paper}}' % len(urls)
+
+        links = [('/bib%d' % i, str(i)) for i in range(10)]
+        scholar = backends.get_backend('scholar')
+        with mock.patch.object(gs, 'fetch', fetch), mock.patch.object(gs, 'get_entries', return_value=links):
+            records = list(backends.search_all(scholar, ['x'], limit=1, session=object()))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(len(urls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import time
+import random
+import unittest
+from unittest import mock
+
+from gscholar import batch
+from querylib.http import Session
+
+
+def fake_query(searchstr, outformat, allresults, session):
+    time.sleep(random.uniform(0, 0.01))
+    if searchstr == 'fail':
+        raise RuntimeError('banned')
+    return [searchstr.upper()]
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_read_items(self):
+        items = list(batch.read_items(['foo bar\n', '\n', '{"pdf": "x.pdf", "id": 1}']))
+        self.assertEqual(items, [{'query': 'foo bar'}, {'pdf': 'x.pdf', 'id': 1}])
+
+    @mock.patch('gscholar.gscholar.query', fake_query)
+    def test_run(self):
+        """Errors don't abort the batch, ordered mode keeps input order."""
+        queries = ['q%d' % i for i in range(20)] + ['fail']
+        items = [{'query': q} for q in queries]
+        for ordered in (False, True):
+            records = list(batch.run(items, jobs=4, ordered=ordered, session=Session()))
+            self.assertEqual(len(records), len(items))
+            if ordered:
+                self.assertEqual([r['index'] for r in records], list(range(len(items))))
+            records.sort(key=lambda r: r['index'])
+            self.assertEqual(records[0]['results'], ['Q0'])
+            self.assertEqual(records[-1]['error'], 'RuntimeError: banned')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import io
+import unittest
+
+from gscholar import bibtex
+from gscholar import gscholar as gs
+
+
+BIBITEM = u"""@string{ieee = "{IEEE}"}
+@article{einstein1905,
+  title={On the {E}lectrodynamics
+         of Moving Bodies},
+  author = "Einstein, Albert",
+  journal = ieee # " Access",
+  booktitle={{IEEE} Access},
+  month = jun,
+  year=1905,
+}
+"""
+
+
+class TestBibtex(unittest.TestCase):
+
+    def test_parse(self):
+        """All fields are returned at once, nested braces are kept."""
+        entries = bibtex.parse(BIBITEM)
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry['ENTRYTYPE'], 'article')
+        self.assertEqual(entry['ID'], 'einstein1905')
+        self.assertEqual(entry['title'], 'On the {E}lectrodynamics of Moving Bodies')
+        self.assertEqual(entry['author'], 'Einstein, Albert')
+        self.assertEqual(entry['journal'], '{IEEE} Access')
+        self.assertEqual(entry['booktitle'], '{IEEE} Access')
+        self.assertEqual(entry['month'], 'June')
+        self.assertEqual(entry['year'], '1905')
+
+    def test_iter_entries(self):
+        """Streaming gives the same entries as parsing at once."""
+        text = BIBITEM + u"@misc(other, note={a (b) c})\n"
+        entries = list(bibtex.iter_entries(io.StringIO(text * 20), chunksize=16))
+        self.assertEqual(entries, bibtex.parse(text * 20))
+        self.assertEqual(len(entries), 40)
+        self.assertEqual(entries[1]['note'], 'a (b) c')
+
+    def test_parenthesized_quoted(self):
+        """Parentheses in a quoted value don't close an entry opened with (."""
+        entries = bibtex.parse(u'@book(k, title="A (b) c", note="x ) y", year=2001)')
+        self.assertEqual(entries[0]['title'], 'A (b) c')
+        self.assertEqual(entries[0]['note'], 'x ) y')
+        self.assertEqual(entries[0]['year'], '2001')
+
+    def test_unterminated(self):
+        with self.assertRaises(bibtex.BibtexError):
+            bibtex.parse(u"@article{key, title={foo}")
+
+    def test_get_bib_element(self):
+        self.assertEqual(gs._get_bib_element(BIBITEM, 'year'), '1905')
+        self.assertEqual(gs._get_bib_element(BIBITEM, 'booktitle'), '{IEEE} Access')
+        self.assertIsNone(gs._get_bib_element(BIBITEM, 'volume'))
+
+
+if __name__ == '__main__':
+    unittest.main()
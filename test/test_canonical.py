@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from querylib.canonical import canonical_query, unique_queries, SingleFlight, SCHOLAR, IEEE
+from ieeelib import ieeelib as ieee
+
+
+class TestCanonicalQuery(unittest.TestCase):
+
+    def test_equivalent(self):
+        for a, b in [('A AND B', 'B AND A'),
+                     ('5G  AND "Security"', '"security" AND 5g'),
+                     ('(a OR b) AND c', 'c AND (b OR a)'),
+                     ('x AND (y AND z)', 'z AND y AND x'),
+                     (u'“Foo  Bar” baz', 'baz "foo bar"'),
+                     ('author:"Albert  Einstein" relativity', 'relativity author:"albert einstein"'),
+                     ('intitle:"general relativity" OR x', 'x OR intitle:"General Relativity"'),
+                     ('5G ONEAR/2 (Security OR privacy)', '5g ONEAR/2 (privacy OR security)')]:
+            self.assertEqual(canonical_query(a, IEEE), canonical_query(b, IEEE), (a, b))
+
+    def test_not_equivalent(self):
+        for a, b in [('A AND B', 'A OR B'),
+                     ('"foo bar"', '"bar foo"'),
+                     ('a NOT b', 'b NOT a'),
+                     # without parentheses the order matters for IEEE
+                     ('a OR b AND c', 'c AND a OR b'),
+                     # a field applies to the phrase following it
+                     ('author:"albert einstein" "general relativity"',
+                      '"albert einstein" author:"general relativity"'),
+                     ('intitle:"a b" c', 'intitle:"a c" b'),
+                     # proximity operators keep their operands in order
+                     ('a ONEAR/2 b', 'b ONEAR/2 a'),
+                     ('a NEAR/2 b', 'a NEAR/3 b'),
+                     ('a NEAR/2 b', 'a AND b')]:
+            self.assertNotEqual(canonical_query(a, IEEE), canonical_query(b, IEEE), (a, b))
+
+    def test_scholar(self):
+        # OR binds tighter than AND
+        self.assertEqual(canonical_query('a OR b c', SCHOLAR), canonical_query('c (b OR a)', SCHOLAR))
+        self.assertEqual(canonical_query('-x y', SCHOLAR), 'NOT x AND y')
+        for a, b in [('author:"albert einstein" "general relativity"',
+                      '"albert einstein" author:"general relativity"'),
+                     ('intitle:"quantum field" theory', 'intitle:"quantum theory" field')]:
+            self.assertNotEqual(canonical_query(a, SCHOLAR), canonical_query(b, SCHOLAR), (a, b))
+        self.assertEqual(canonical_query('intitle:"Quantum  Field" theory', SCHOLAR),
+                         canonical_query('theory intitle:"quantum field"', SCHOLAR))
+
+    def test_unique_queries(self):
+        queries = ['A AND B', 'b AND a', 'A OR B', 'a AND b AND a']
+        self.assertEqual(list(unique_queries(queries)), ['A AND B', 'A OR B'])
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_shared(self):
+        """Concurrent calls with the same key share one result."""
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def fn(x):
+            calls.append(x)
+            started.set()
+            time.sleep(0.1)
+            return [x]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', fn, 1)))]
+        threads[0].start()
+        started.wait()
+        threads += [threading.Thread(target=lambda: results.append(flight.do('k', fn, 2))) for _ in range(3)]
+        for t in threads[1:]:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [[1]] * 4)
+        self.assertEqual(flight.shared, 3)
+        # finished calls are not remembered
+        self.assertEqual(flight.do('k', fn, 3), [3])
+
+    def test_error(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise IOError("down")
+        with self.assertRaises(IOError):
+            flight.do('k', fail)
+        self.assertEqual(flight.do('k', lambda: 1), 1)
+
+    def test_ieeelib(self):
+        """Equivalent IEEE queries running at the same time send one request."""
+        urls = []
+
+        def fetch(url, header, session=None, span_url=None):
+            urls.append(url)
+            time.sleep(0.1)
+            return '{}'
+        with mock.patch.object(ieee, 'fetch', fetch):
+            threads = [threading.Thread(target=ieee.query, args=(q, 'key'))
+                       for q in ['5G AND security', 'Security AND  5G', '5G OR security']]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(urls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
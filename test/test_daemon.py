@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import subprocess
+import unittest
+from optparse import Values
+from unittest import mock
+
+from gscholar import daemon
+from gscholar import __main__ as cli
+
+
+def fake_query(searchstr, outformat, allresults, session=None):
+    if searchstr == 'fail':
+        raise RuntimeError('banned')
+    return [searchstr.upper()]
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'gscholar.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def start(self):
+        server = daemon.make_server(self.path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    @mock.patch('gscholar.gscholar.query', fake_query)
+    def test_round_trip(self):
+        server = self.start()
+        try:
+            self.assertEqual(daemon.call('query', self.path, searchstr='einstein'), ['EINSTEIN'])
+            with self.assertRaises(daemon.DaemonError):
+                daemon.call('query', self.path, searchstr='fail')
+            # a second daemon doesn't steal the socket
+            with self.assertRaises(daemon.AlreadyRunning):
+                daemon.make_server(self.path)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_socket(self):
+        """A socket left behind by a killed daemon is replaced."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()
+        with self.assertRaises(OSError):
+            daemon.call('query', self.path, searchstr='x')
+        server = daemon.make_server(self.path)
+        server.server_close()
+
+    @mock.patch('gscholar.query', fake_query)
+    def test_fallback(self):
+        """Without a daemon the CLI does the lookup itself."""
+        options = Values({'no_daemon': False, 'socket': self.path, 'all': False})
+        self.assertEqual(cli.lookup(options, 'einstein', 4, False), ['EINSTEIN'])
+
+    def test_sigterm(self):
+        """The socket is removed when the daemon is terminated."""
+        code = 'from gscholar import daemon; daemon.serve(%r)' % self.path
+        process = subprocess.Popen([sys.executable, '-c', code],
+                                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            for _ in range(100):
+                if os.path.exists(self.path):
+                    break
+                time.sleep(0.05)
+            self.assertTrue(os.path.exists(self.path))
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(10), 0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
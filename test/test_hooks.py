@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+
+from querylib import hooks
+from querylib import http
+
+
+class TestHooks(unittest.TestCase):
+
+    def test_disabled(self):
+        """Without hooks, span hands out the shared no-op span."""
+        with hooks.span('test', bytes=1) as s:
+            s.set('status', 200)
+        self.assertIs(s, hooks.NULL_SPAN)
+
+    def test_metrics(self):
+        """Finished spans are aggregated into prometheus metrics."""
+        metrics = hooks.Metrics()
+        hooks.add_hook(metrics)
+        try:
+            for i in range(2):
+                with hooks.span('http.read', status=200) as s:
+                    s.set('bytes', 10)
+            with self.assertRaises(ValueError):
+                with hooks.span('http.read', status=503):
+                    raise ValueError()
+        finally:
+            hooks.remove_hook(metrics)
+        dump = metrics.dump()
+        self.assertIn('sbqt_span_seconds_count{span="http.read"} 3', dump)
+        self.assertIn('sbqt_span_bytes_total{span="http.read"} 20', dump)
+        self.assertIn('sbqt_span_errors_total{span="http.read"} 1', dump)
+        self.assertIn('sbqt_http_responses_total{span="http.read",code="503"} 1', dump)
+        self.assertFalse(hooks.enabled())
+
+    def test_error_status(self):
+        """Error responses are recorded with their status."""
+        session = mock.Mock()
+        session.request.side_effect = HTTPError('http://x', 503, 'Unavailable', {}, None)
+        metrics = hooks.Metrics()
+        hooks.add_hook(metrics)
+        try:
+            with self.assertRaises(HTTPError):
+                http.fetch('http://x', {}, session)
+        finally:
+            hooks.remove_hook(metrics)
+        self.assertIn('sbqt_http_responses_total{span="http.request",code="503"} 1', metrics.dump())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import time
+import threading
+import unittest
+from urllib.error import HTTPError
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from querylib import hooks
+from querylib.http import Session, RateLimiter, read_body, fetch, BodyTooLarge
+
+# 3000 bytes, with multi-byte characters crossing any chunk boundary
+BODY = (u'Ångström ' * 300).encode('utf8')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/target')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(BODY), 1000):
+                chunk = BODY[i:i + 1000]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        if self.path.startswith('/error'):
+            # a small error page, or one larger than querylib.http.DRAIN_SIZE
+            body = b'x' * (10 if self.path == '/error' else 10**6)
+            self.send_response(503)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = BODY if self.path == '/body' else self.path.encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSession(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_port
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_keep_alive(self):
+        """Connections are reused and redirects followed."""
+        session = Session()
+        for i in range(3):
+            response = session.request(self.url + '/redirect')
+            self.assertEqual(response.getcode(), 200)
+            self.assertEqual(response.read(), b'/target')
+        idle = session._idle[('http', self.url[len('http://'):])]
+        self.assertEqual(len(idle), 1)
+        session.close()
+
+    def test_stale_connections(self):
+        """A request on a closed idle connection is retried on a new one."""
+        class Stale(object):
+            def request(self, *args, **kwargs):
+                raise ConnectionResetError()
+
+            def close(self):
+                pass
+
+        session = Session()
+        key = ('http', self.url[len('http://'):])
+        session._idle[key] = [Stale(), Stale()]
+        spans = []
+        hooks.add_hook(spans.append)
+        try:
+            self.assertEqual(fetch(self.url + '/fresh', session=session), '/fresh')
+        finally:
+            hooks.remove_hook(spans.append)
+        self.assertEqual([type(c) for c in session._idle[key]].count(Stale), 1)
+        # the new connection is set up in its own span, the retry counted
+        self.assertEqual([s.name for s in spans], ['http.connect', 'http.request', 'http.read'])
+        self.assertEqual(spans[1].attributes['retries'], 1)
+        session.close()
+
+    def test_read_body(self):
+        """Bodies are read in memory or spooled, the connection is reused."""
+        session = Session()
+        for path in ['/body', '/chunked']:
+            for spool_size, spooled in [(10000, False), (100, True)]:
+                with read_body(session.request(self.url + path), spool_size=spool_size) as body:
+                    self.assertEqual(body.spooled, spooled)
+                    self.assertEqual(body.tobytes(), BODY)
+                    self.assertEqual(body.text(), BODY.decode('utf8'))
+        idle = session._idle[('http', self.url[len('http://'):])]
+        self.assertEqual(len(idle), 1)
+        session.close()
+
+    def test_error_body(self):
+        """Small error bodies are drained, the connection of large ones is closed."""
+        session = Session()
+        key = ('http', self.url[len('http://'):])
+        for path, idle in [('/error', 1), ('/error-large', 0)]:
+            with self.assertRaises(HTTPError) as cm:
+                session.request(self.url + path)
+            self.assertEqual(cm.exception.code, 503)
+            self.assertEqual(len(session._idle.get(key, [])), idle)
+        session.close()
+
+    def test_max_body_size(self):
+        session = Session()
+        for path in ['/body', '/chunked']:
+            with self.assertRaises(BodyTooLarge):
+                read_body(session.request(self.url + path), max_size=1000, spool_size=100)
+        session.close()
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+        for i in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import ieeelib
+from ieeelib import ieeelib as ieee
+from ieeelib.delta import DeltaState, query_new
+from ieeelib.keypool import KeyPool
+
+TOTAL_RECORDS = 95
+
+# article numbers 1 to 95, ten articles per year starting in 2010
+ARTICLES = [{"article_number": str(n), "publication_year": 2010 + (n - 1) // 10}
+            for n in range(1, TOTAL_RECORDS + 1)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Stand-in for the IEEE Xplore API serving ARTICLES."""
+
+    requests = 0
+    # number of requests answered as over the per-second limit
+    over_qps = 0
+
+    def do_GET(self):
+        Handler.requests += 1
+        params = parse_qs(urlparse(self.path).query)
+        if params['apikey'] == ['over-quota'] or Handler.over_qps:
+            self.send_response(403)
+            if Handler.over_qps:
+                Handler.over_qps -= 1
+                self.send_header('X-Mashery-Error-Code', 'ERR_403_DEVELOPER_OVER_QPS')
+            else:
+                self.send_header('X-Mashery-Error-Code', 'ERR_403_DEVELOPER_OVER_RATE')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start = int(params['start_record'][0])
+        count = int(params['max_records'][0])
+        # like the real API, rank and citation counts change between requests
+        articles = [dict(a, rank=i + 1, citing_paper_count=Handler.requests)
+                    for i, a in enumerate(ARTICLES)]
+        if 'start_year' in params:
+            year = int(params['start_year'][0])
+            articles = [a for a in articles if a["publication_year"] >= year]
+        if params.get('sort_field') == ['publication_year']:
+            articles = sorted(articles, key=lambda a: a["publication_year"],
+                              reverse=params.get('sort_order') == ['desc'])
+        body = json.dumps({"total_records": len(articles),
+                           "articles": articles[start - 1:start - 1 + count]}).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestQueryPages(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:%d/api/v1/search/articles' % cls.server.server_port
+        cls.patch = mock.patch.object(ieee, 'IEEE_URL', url)
+        cls.patch.start()
+        cls.tmpdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patch.stop()
+        shutil.rmtree(cls.tmpdir)
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def numbers(self, pages):
+        return [int(a["article_number"]) for page in pages for a in page["articles"]]
+
+    def test_all_pages_in_order(self):
+        pages = ieeelib.query_pages("5G", "key", max_records=10, jobs=3)
+        self.assertEqual(self.numbers(pages), list(range(1, TOTAL_RECORDS + 1)))
+
+    def test_limit(self):
+        pages = ieeelib.query_pages("5G", "key", max_records=10, limit=25)
+        self.assertEqual(self.numbers(pages), list(range(1, 26)))
+
+
+    def test_delta(self):
+        """The second run only fetches until it reaches known records."""
+        state = DeltaState(os.path.join(self.tmpdir, 'state.json'))
+        new = list(query_new("5G", state, "key", max_records=10))
+        self.assertEqual(len(new), TOTAL_RECORDS)
+        self.assertEqual(state.latest_year, 2019)
+        state.save()
+
+        # two new articles, one changed article
+        ARTICLES.append({"article_number": "96", "publication_year": 2019})
+        ARTICLES.append({"article_number": "97", "publication_year": 2020})
+        ARTICLES[-3] = dict(ARTICLES[-3], title="changed")
+        try:
+            state = DeltaState(os.path.join(self.tmpdir, 'state.json'))
+            Handler.requests = 0
+            new = list(query_new("5G", state, "key", max_records=3))
+        finally:
+            del ARTICLES[TOTAL_RECORDS:]
+            ARTICLES[-1] = {"article_number": "95", "publication_year": 2019}
+        self.assertEqual(sorted(a["article_number"] for a in new), ['95', '96', '97'])
+        self.assertEqual(state.latest_year, 2020)
+        self.assertEqual(Handler.requests, 3)
+
+    def test_delta_unordered(self):
+        """A new record of the latest year is found after a page of known ones."""
+        state = DeltaState(os.path.join(self.tmpdir, 'unordered.json'))
+        list(query_new("5G", state, "key", max_records=10))
+        ARTICLES.append({"article_number": "96", "publication_year": 2019})
+        try:
+            new = list(query_new("5G", state, "key", max_records=3))
+        finally:
+            del ARTICLES[TOTAL_RECORDS:]
+        self.assertEqual([a["article_number"] for a in new], ['96'])
+
+    def test_switch_keys(self):
+        """A key over its quota is marked exhausted and the next one used."""
+        pool = KeyPool(['over-quota', 'valid'], calls_per_day=10)
+        result = json.loads(ieee.query("5G", pool, max_records=10))
+        self.assertEqual(len(result["articles"]), 10)
+        # over-quota is used up, valid was called once
+        self.assertEqual(pool.remaining(), 9)
+        self.assertEqual(pool.acquire(), 'valid')
+
+    def test_over_qps(self):
+        """A key over the per-second limit is retried after a second, not dropped."""
+        pool = KeyPool(['valid'], calls_per_day=10)
+        Handler.over_qps = 1
+        with mock.patch.object(ieee.time, 'sleep') as sleep:
+            result = json.loads(ieee.query("5G", pool, max_records=10))
+        self.assertEqual(len(result["articles"]), 10)
+        sleep.assert_called_once_with(1)
+        self.assertEqual(pool.remaining(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
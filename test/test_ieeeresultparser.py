@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import io
+import json
+import unittest
+
+import bibtexparser
+
+import ieeelib.ieeeresultparser as ieeeparser
+
+
+def article(n):
+    content_type = ("Journals", "Conferences", "Books")[n % 3]
+    return {"article_number": str(9000 - n), "content_type": content_type,
+            "title": "Paper %d" % n, "authors": {"authors": [{"full_name": "Author %d" % n}]},
+            "publication_title": "IEEE Access", "publication_date": "2019",
+            "conference_dates": "20-24 May 2019", "index_terms": {}}
+
+
+class TestDumpsParallel(unittest.TestCase):
+
+    def test_same_as_sequential(self):
+        """The chunks are merged in input order, json lines are accepted."""
+        articles = [article(n) for n in range(25)]
+        writer = bibtexparser.bwriter.BibTexWriter()
+        writer.order_entries_by = None
+        expected = writer.write(ieeeparser.bibtexize({"articles": articles}))
+        result = "".join(ieeeparser.dumps_parallel(articles, jobs=2, chunk_size=4))
+        self.assertEqual(result, expected)
+        lines = [json.dumps(a) for a in articles]
+        result = "".join(ieeeparser.dumps_parallel(lines, jobs=2, chunk_size=4))
+        self.assertEqual(result, expected)
+        result = "".join(ieeeparser.dumps_parallel(articles, jobs=1, chunk_size=4))
+        self.assertEqual(result, expected)
+
+    def test_read_articles(self):
+        """Json pages and json lines are read by the same reader, the articles as json."""
+        articles = [article(n) for n in range(3)]
+        # a string which looks like the start of the articles
+        articles[1]["title"] = 'The "articles": [ key'
+        page = {"total_records": 3, "articles": articles, "total_searched": 9}
+        for dump in [json.dumps(page), json.dumps(page, indent=2), "\n" + json.dumps(page) + "\n",
+                     "\n".join(json.dumps(a) for a in articles) + "\n"]:
+            result = [json.loads(a) for a in ieeeparser.read_articles(io.StringIO(dump))]
+            self.assertEqual(result, articles, dump)
+        self.assertEqual(list(ieeeparser.read_articles(io.StringIO("\n"))), [])
+        with self.assertRaises(ValueError):
+            list(ieeeparser.read_articles(io.StringIO('{"articles": [{"a": 1}')))
+
+    def test_unknown_content_type(self):
+        articles = [article(0), dict(article(1), content_type="Magazines")]
+        with self.assertRaises(ieeeparser.UnknownContentType):
+            ieeeparser.bibtexize({"articles": articles})
+        with self.assertRaises(ieeeparser.UnknownContentType):
+            list(ieeeparser.dumps_parallel(articles, jobs=2, chunk_size=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ieeelib.keypool import KeyPool, QuotaExhausted
+
+
+class TestKeyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.counter_file = os.path.join(self.dir, 'usage.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_spread_and_exhaust(self):
+        """Calls are spread over the keys until all daily quotas are used."""
+        pool = KeyPool(['a', 'b', 'c'], self.counter_file, calls_per_day=2)
+        keys = [pool.acquire() for i in range(6)]
+        self.assertEqual(sorted(keys), ['a', 'a', 'b', 'b', 'c', 'c'])
+        self.assertEqual(set(keys[:3]), set(['a', 'b', 'c']))
+        with self.assertRaises(QuotaExhausted):
+            pool.acquire()
+
+    def test_persistent(self):
+        """The counters are shared through the counter file."""
+        KeyPool(['a', 'b'], self.counter_file, calls_per_day=3).exhausted('a')
+        pool = KeyPool(['a', 'b'], self.counter_file, calls_per_day=3)
+        self.assertEqual(pool.remaining(), 3)
+        self.assertEqual(pool.acquire(), 'b')
+        with open(self.counter_file) as f:
+            self.assertNotIn('"a"', f.read())
+
+    def test_per_second(self):
+        pool = KeyPool(['a'], calls_per_second=2, calls_per_day=10)
+        for i in range(3):
+            pool.acquire()
+        self.assertEqual(pool.remaining(), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import unittest
+
+from ieeelib.record import Article, iter_articles
+
+
+ARTICLE = {
+    "article_number": "8000001",
+    "content_type": "Journals",
+    "title": "Security in 5G networks",
+    "authors": {"authors": [{"full_name": "A. Author", "affiliation": "University"},
+                            {"full_name": "B. Author"}]},
+    "publisher": "IEEE",
+    "index_terms": {"author_terms": {"terms": ["5G", "security"]}},
+}
+
+
+class TestArticle(unittest.TestCase):
+
+    def test_from_json(self):
+        a = Article.from_json(ARTICLE)
+        self.assertEqual(a.title, "Security in 5G networks")
+        self.assertEqual(a.authors, ("A. Author", "B. Author"))
+        self.assertEqual(a.affiliations, ("University", None))
+        self.assertEqual(a.keywords, ("5G", "security"))
+        # fields the API didn't return are None
+        self.assertIsNone(a.doi)
+        with self.assertRaises(AttributeError):
+            a.unknown_field = 1
+
+    def test_missing_index_terms(self):
+        a = Article.from_json({"article_number": "1", "index_terms": {}})
+        self.assertIsNone(a.keywords)
+        self.assertEqual(a.authors, ())
+
+    def test_shared_values(self):
+        """Repeated values are stored once."""
+        other = dict(ARTICLE, publisher="".join(["IE", "EE"]))
+        a, b = iter_articles({"articles": [ARTICLE, other]})
+        self.assertIs(a.publisher, b.publisher)
+        self.assertEqual(a, b)
+        self.assertEqual(list(iter_articles({"articles": [a]}))[0], a)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from gscholar import rename
+
+
+BIBITEM = u"""@article{key,
+  title={A/B {T}esting: Why? },
+  author={Kohavi, Ron},
+  year={2009},
+}
+"""
+
+
+class TestRename(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def touch(self, name):
+        path = os.path.join(self.dir, name)
+        open(path, 'w').close()
+        return path
+
+    def test_sanitize(self):
+        self.assertEqual(rename.make_filename(BIBITEM), '2009-Kohavi-AB Testing Why.pdf')
+        self.assertEqual(len(rename.sanitize(u'\xe4' * 200, 101).encode('utf8')), 100)
+
+    def test_collisions(self):
+        """Clashing names get deterministic suffixes, nothing is overwritten."""
+        self.touch('2009-Kohavi-AB Testing Why.pdf')
+        pdfs = [self.touch('b.pdf'), self.touch('a.pdf')]
+        moves = rename.plan([(pdf, BIBITEM) for pdf in pdfs])
+        self.assertEqual([os.path.basename(dst) for src, dst in moves],
+                         ['2009-Kohavi-AB Testing Why-2.pdf',
+                          '2009-Kohavi-AB Testing Why-3.pdf'])
+        self.assertEqual(moves[0][0], pdfs[1])
+
+    def test_malformed(self):
+        """A malformed entry only skips its own file."""
+        pdfs = [self.touch('a.pdf'), self.touch('b.pdf')]
+        moves = rename.plan([(pdfs[0], u'@article{key, title={Unbalanced'), (pdfs[1], BIBITEM)])
+        self.assertEqual(moves, [(pdfs[1], os.path.join(self.dir, '2009-Kohavi-AB Testing Why.pdf'))])
+
+    def test_execute_and_undo(self):
+        pdfs = [self.touch('a.pdf'), self.touch('b.pdf')]
+        log = os.path.join(self.dir, 'undo.log')
+        moves = rename.plan([(pdf, BIBITEM) for pdf in pdfs])
+        rename.execute(moves, log)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['2009-Kohavi-AB Testing Why-2.pdf',
+                          '2009-Kohavi-AB Testing Why.pdf', 'undo.log'])
+        self.assertEqual(rename.undo(log), 2)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['a.pdf', 'b.pdf', 'undo.log'])
+
+    def test_rollback(self):
+        """If one move fails, the whole batch is reverted."""
+        pdfs = [self.touch('a.pdf'), self.touch('b.pdf')]
+        moves = rename.plan([(pdf, BIBITEM) for pdf in pdfs])
+        # someone else takes the second name after planning
+        self.touch(os.path.basename(moves[1][1]))
+        with self.assertRaises(rename.RenameError):
+            rename.execute(moves)
+        self.assertTrue(os.path.exists(pdfs[0]))
+        self.assertTrue(os.path.exists(pdfs[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from querylib import backends, snowball
+from querylib.backends import Backend, make_record
+from gscholar import gscholar as gs
+
+
+def paper(n):
+    return make_record('fake', str(n), 'Paper %d' % n, year='2020',
+                       doi='10.1/%d' % n if n % 2 else None)
+
+
+class FakeBackend(Backend):
+    """Paper n is cited by the papers 2n+1 and 2n+2 (a binary tree)."""
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def citing(self, record, session=None):
+        n = int(record['id'])
+        self.calls.append(n)
+        if n == 5:
+            raise IOError("connection reset")
+        # the seed is cited by every paper of the second level as well
+        return [paper(2 * n + 1), paper(2 * n + 2)] + ([paper(0)] if n in (1, 2) else [])
+
+
+class TestSnowball(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'graph.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_depth(self):
+        """Papers are found at their lowest depth and expanded once."""
+        backend = FakeBackend()
+        graph = snowball.snowball(backend, [paper(0)], self.path, depth=2, jobs=2)
+        self.assertEqual(sorted(backend.calls), [0, 1, 2])
+        self.assertEqual(len(graph), 7)
+        self.assertEqual([r['id'] for r in graph.records()][:3], ['0', '1', '2'])
+        edges = set(graph.edges())
+        self.assertIn(('doi:10.1/1', 'title:paper0:2020', 'cites'), edges)
+        self.assertIn(('title:paper0:2020', 'doi:10.1/1', 'cites'), edges)
+        graph.close()
+
+    def test_budget_and_resume(self):
+        """A run stops after budget expansions, the next one continues."""
+        backend = FakeBackend()
+        snowball.snowball(backend, [paper(0)], self.path, depth=3, jobs=1, budget=2).close()
+        self.assertEqual(backend.calls, [0, 1])
+        graph = snowball.snowball(backend, [paper(0)], self.path, depth=3, jobs=1)
+        # paper 5 failed and is left for the next run
+        self.assertEqual(sorted(backend.calls), [0, 1, 2, 3, 4, 5, 6])
+        self.assertEqual(len(graph), 13)
+        graph.close()
+
+    def test_unsupported(self):
+        backend = backends.get_backend('dblp')
+        with self.assertRaises(NotImplementedError):
+            snowball.snowball(backend, [paper(0)], ':memory:', session=object())
+
+    def test_scholar_citing_pages(self):
+        """The "cited by" list of a paper is paged through, up to max_citing."""
+        calls = []
+
+        def cited_by(cluster, outformat, allresults, session, start):
+            calls.append(start)
+            # result 3 has no bibtex link, so the first page is short
+            return [('@article{p%d, title={Paper %d}, year={2020}}' % (n, n), str(n))
+                    for n in range(start, min(start + 10, 25)) if n != 3]
+        backend = backends.get_backend('scholar')
+        seed = dict(paper(0), cluster='seed')
+        with mock.patch.object(gs, 'cited_by', cited_by):
+            citing = backend.citing(seed)
+            self.assertEqual([r['cluster'] for r in citing], [str(n) for n in range(25) if n != 3])
+            self.assertEqual(calls, [0, 10, 20, 30])
+            backend.max_citing = 15
+            self.assertEqual(len(backend.citing(seed)), 15)
+            graph = snowball.snowball(backends.get_backend('scholar'), [seed], ':memory:', session=object())
+            self.assertEqual(len(graph), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf8
+
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from querylib.tasks import bounded
+
+
+class TestBounded(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+
+    def square(self, n):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        # later items finish first
+        time.sleep(0.001 * (20 - n))
+        with self.lock:
+            self.running -= 1
+        return n * n
+
+    def test_ordered(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = [(n, f.result()) for n, f in bounded(executor, self.square, range(20), 3)]
+        self.assertEqual(results, [(n, n * n) for n in range(20)])
+        self.assertLessEqual(self.most, 3)
+
+    def test_unordered(self):
+        consumed = []
+
+        def items():
+            for n in range(20):
+                consumed.append(n)
+                yield n
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            calls = bounded(executor, self.square, items(), 4, ordered=False)
+            next(calls)
+            # the items are only consumed as calls finish
+            self.assertEqual(len(consumed), 5)
+            results = sorted(f.result() for n, f in calls)
+        self.assertEqual(len(results), 19)
+        self.assertLessEqual(self.most, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()